@@ -0,0 +1,71 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from higgs.flat_selection import find_z_candidates
+from higgs.pairing import find_z_candidates_columnar
+
+
+def generate_synthetic_leptons(n_events, seed=42):
+    """
+    Generates a flattened lepton DataFrame with 2 to 6 leptons per event,
+    in the same layout as load_data_from_file (event_id, pt, eta, phi, mass, charge, iso, flavor).
+    """
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(2, 7, size=n_events)
+    n_leptons = counts.sum()
+
+    flavor = rng.choice([11, 13], size=n_leptons)
+    return pd.DataFrame({
+        'event_id': np.repeat(np.arange(n_events, dtype=np.int64), counts),
+        'pt': rng.uniform(5, 60, size=n_leptons),
+        'eta': rng.uniform(-2.5, 2.5, size=n_leptons),
+        'phi': rng.uniform(-np.pi, np.pi, size=n_leptons),
+        'mass': np.where(flavor == 13, 0.105658, 0.000511),
+        'charge': rng.choice([-1, 1], size=n_leptons),
+        'iso': rng.uniform(0, 0.3, size=n_leptons),
+        'flavor': flavor,
+    })
+
+
+def add_lorentz_vectors(df):
+    """ Adds the 'lv' column expected by the loop version of find_z_candidates (needs the vector package). """
+    import vector
+
+    df['lv'] = vector.array({
+        "pt": df['pt'], "eta": df["eta"],
+        "phi": df["phi"], "mass": df["mass"]
+    })
+    return df
+
+
+def check_parity(reference_df, columnar_df):
+    """ Checks that both implementations select the same events with the same M4l. """
+    if not np.array_equal(reference_df['event_id'].to_numpy(), columnar_df['event_id'].to_numpy()):
+        return False
+    return np.allclose(reference_df['mass'].to_numpy(), columnar_df['mass'].to_numpy(), rtol=1e-9, atol=1e-9)
+
+
+if __name__ == "__main__":
+    n_events = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    leptons_df = add_lorentz_vectors(generate_synthetic_leptons(n_events))
+    print(f"Synthetic sample: {n_events} events, {len(leptons_df)} leptons")
+
+    start = time.perf_counter()
+    reference_df = find_z_candidates(leptons_df.copy())
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    columnar_df = find_z_candidates_columnar(leptons_df)
+    columnar_time = time.perf_counter() - start
+
+    if not check_parity(reference_df, columnar_df):
+        print("ERROR: columnar pairing does not match the loop version.")
+        sys.exit(1)
+
+    print(f"Parity OK: {len(columnar_df)} candidates selected by both versions.")
+    print(f"Loop version     : {loop_time:8.3f} s ({n_events / loop_time:12.0f} events/s)")
+    print(f"Columnar version : {columnar_time:8.3f} s ({n_events / columnar_time:12.0f} events/s)")
+    print(f"Speedup          : x{loop_time / columnar_time:.1f}")
@@ -0,0 +1,139 @@
+import os
+import sys
+import json
+import time
+import shutil
+import subprocess
+
+from higgs import config
+from higgs.pipeline import run_units
+from higgs.profiler import StageProfiler, peak_rss_mb
+from higgs.scheduler import build_work_units
+from higgs.checkpoint import check_coverage
+from higgs.histogram import merge_histogram_parts
+from higgs.synthetic_events import write_synthetic_file
+
+# Synthetic inputs, outputs and the history of the benchmark results
+BENCH_DIR = config.DATA_DIR + "benchmark/"
+HISTORY_PATH = BENCH_DIR + "benchmark_history.json"
+
+# Event counts benchmarked when none is given on the command line
+DEFAULT_SIZES = [100_000, 1_000_000]
+
+
+def synthetic_input(n_events, seed=0):
+    """ Path of the synthetic file of n_events events, generated the first time it is needed. """
+    path = os.path.join(BENCH_DIR, f"synthetic_{n_events}.root")
+    if not os.path.exists(path):
+        os.makedirs(BENCH_DIR, exist_ok=True)
+        print(f"Generating {n_events} synthetic events in {path}...")
+        write_synthetic_file(path + ".tmp", n_events, seed=seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def git_commit():
+    """ Short hash of the checked-out commit, or None outside a git repository. """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_pipeline(input_files, output_dir, n_workers=1, profiler=None):
+    """
+    Runs the pipeline (with the current higgs.config settings) on input_files ({key: path}),
+    writing to output_dir (emptied first) and without the skim cache, so that every stage runs,
+    on n_workers workers of the config.EXECUTOR backend.
+    The writing of the outputs is profiled in profiler. Chunk histograms are merged per key.
+    Returns the (unit, result) list of run_units.
+    """
+    shutil.rmtree(output_dir, ignore_errors=True)
+    config.set_output_dir(output_dir)
+    config.USE_SKIM_CACHE = False
+    config.N_WORKERS = n_workers
+
+    units = build_work_units(input_files, config.MAX_EVENTS)
+    check_coverage(units)
+    results = run_units(units, profiler=profiler)
+    for key in input_files:
+        merge_histogram_parts(config.HISTOGRAM_DIR, key)
+    return results
+
+
+def run_benchmark(n_events, n_workers=config.N_WORKERS):
+    """
+    Runs the pipeline on a synthetic file of n_events events.
+    Returns the benchmark record: wall time, events/s, peak memory and the stage profile.
+    """
+    input_path = synthetic_input(n_events)
+    output_dir = os.path.join(BENCH_DIR, f"output_{n_events}/")
+
+    write_profile = StageProfiler()
+    start = time.perf_counter()
+    results = run_pipeline({"Synthetic": input_path}, output_dir, n_workers, write_profile)
+    wall_s = time.perf_counter() - start
+
+    profile = StageProfiler()
+    for _, result in results:
+        profile.merge(result['profile'])
+    profile.merge(write_profile.stages)
+    profile.print_summary()
+    stages = profile.to_dict()
+
+    return {
+        'date': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'commit': git_commit(),
+        'n_events': n_events,
+        'n_workers': n_workers,
+        'executor': config.EXECUTOR,
+        'pipeline_mode': config.PIPELINE_MODE,
+        'n_candidates': sum(result['n_candidates'] for _, result in results),
+        'wall_s': wall_s,
+        'events_per_s': n_events / wall_s,
+        # Peak resident memory of any worker (from the stage profiles) or of this process
+        'peak_rss_mb': max([peak_rss_mb()] + [stats['peak_rss_mb'] for stats in stages.values()]),
+        'stages': stages,
+    }
+
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_history(history, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(history, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def print_record(record, previous=None):
+    """ Prints a benchmark record, and its change relative to the previous comparable record. """
+    line = (f"{record['n_events']:>12,} events  {record['wall_s']:>9.2f} s  "
+            f"{record['events_per_s']:>12,.0f} events/s  {record['peak_rss_mb']:>8.0f} MB peak")
+    if previous is not None:
+        line += (f"  (x{record['events_per_s'] / previous['events_per_s']:.2f} events/s, "
+                 f"{record['peak_rss_mb'] - previous['peak_rss_mb']:+.0f} MB vs {previous['commit']})")
+    print(line)
+
+
+if __name__ == '__main__':
+    sizes = [int(float(arg)) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    history = load_history()
+
+    for n_events in sizes:
+        record = run_benchmark(n_events)
+        comparable = [
+            old for old in history
+            if (old['n_events'], old['n_workers'], old.get('executor', "processes"), old['pipeline_mode'])
+            == (record['n_events'], record['n_workers'], record['executor'], record['pipeline_mode'])
+        ]
+        print_record(record, comparable[-1] if comparable else None)
+        history.append(record)
+        save_history(history)
@@ -0,0 +1,18 @@
+import importlib
+
+# H -> ZZ -> 4l analysis of the CMS Open Data.
+# Importing the package loads nothing heavy: each submodule (pipeline, plotting, fit, ...) is
+# imported the first time it is used, e.g. higgs.pipeline.run() or 'from higgs.fit import fit_signal'.
+# The command line is 'higgs' (or 'python -m higgs'): run, skim, plot, fit.
+
+__all__ = [
+    "candidate_store", "checkpoint", "checksums", "cli", "config", "datasets", "event_selection", "executors",
+    "fit", "flat_selection", "histogram", "kinematics", "lepton_table", "lumi_mask", "pairing", "pipeline",
+    "plotting", "prefetch", "profiler", "results", "scheduler", "skim_cache", "synthetic_events", "variations",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
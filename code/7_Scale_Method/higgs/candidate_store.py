@@ -0,0 +1,145 @@
+import os
+import glob
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs
+
+# Typed columns of a Higgs candidate record, in file order.
+# Lepton indices refer to the position of the lepton in its NanoAOD collection,
+# the Muon one for a Z with flavor 13 and the Electron one for a Z with flavor 11.
+CANDIDATE_SCHEMA = pa.schema([
+    ("run", pa.int64()),
+    ("luminosityBlock", pa.int64()),
+    ("event_id", pa.int64()),
+    ("z1_mass", pa.float32()),
+    ("z2_mass", pa.float32()),
+    ("mass", pa.float32()),
+    ("z1_flavor", pa.int64()),
+    ("z2_flavor", pa.int64()),
+    ("l1_idx", pa.int64()),
+    ("l2_idx", pa.int64()),
+    ("l3_idx", pa.int64()),
+    ("l4_idx", pa.int64()),
+])
+
+
+def partition_path(output_dir, key):
+    """ Directory holding the candidate files of one dataset key (hive style 'key=<key>'). """
+    return os.path.join(output_dir, f"key={key}")
+
+
+def write_candidates(z_df, output_dir, key, index):
+    """
+    Writes the candidates of one chunk as an uncompressed Arrow IPC (Feather v2) file,
+    in the partition of its dataset key. Columns are cast to CANDIDATE_SCHEMA;
+    columns that a pipeline mode does not produce are simply not written.
+    Returns the path of the written file.
+    """
+    fields = [field for field in CANDIDATE_SCHEMA if field.name in z_df.columns]
+    schema = pa.schema(fields)
+    table = pa.Table.from_pandas(z_df[schema.names], schema=schema, preserve_index=False)
+
+    directory = partition_path(output_dir, key)
+    os.makedirs(directory, exist_ok=True)
+    output_filename = os.path.join(directory, f"part-{index:05d}.arrow")
+
+    # Write to a temporary name first, so a crash never leaves a truncated file behind
+    tmp_filename = output_filename + ".tmp"
+    with pa.OSFile(tmp_filename, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_filename, output_filename)
+    return output_filename
+
+
+def open_candidates(output_dir):
+    """
+    Opens every candidate file below output_dir as one Arrow dataset.
+    Files are memory-mapped, and 'key' is available as a partition column.
+    """
+    return ds.dataset(
+        output_dir,
+        format="ipc",
+        partitioning="hive",
+        filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=True,
+    )
+
+
+# Columns identifying a collision, from the most to the least significant
+EVENT_ID_COLUMNS = ['run', 'luminosityBlock', 'event_id']
+
+
+def remove_duplicate_events(z_df, key_priority):
+    """
+    Keeps a single candidate per (run, luminosityBlock, event_id), or per event_id for candidate files
+    written without run and luminosityBlock (flat mode before they were stored).
+    The same collision can be recorded in several primary datasets (e.g. DoubleMuon and DoubleElectron);
+    the candidate of the first dataset key in key_priority is kept.
+    """
+    rank = {key: position for position, key in enumerate(key_priority)}
+    order = z_df['key'].map(rank).fillna(len(rank))
+    z_df = z_df.assign(_rank=order).sort_values('_rank', kind='stable')
+    z_df = z_df.drop_duplicates(subset=[name for name in EVENT_ID_COLUMNS if name in z_df.columns], keep='first')
+    return z_df.drop(columns=['_rank']).sort_index()
+
+
+def read_candidates(output_dir, columns=None, keys=None, drop_duplicates=False):
+    """
+    Loads candidates into a pandas DataFrame, reading only the requested columns
+    (all columns when None) and only the requested dataset keys (all keys when None).
+    With drop_duplicates, events found in several datasets are kept once,
+    preferring the order of keys (alphabetical order when keys is None).
+    """
+    if not os.path.isdir(output_dir):
+        raise FileNotFoundError(f"No candidate directory found at {output_dir}")
+
+    dataset = open_candidates(output_dir)
+    row_filter = ds.field("key").isin(list(keys)) if keys is not None else None
+
+    read_columns = columns
+    if drop_duplicates and columns is not None:
+        # The event identifiers are needed to find duplicates, even if they were not requested
+        id_columns = [name for name in EVENT_ID_COLUMNS if name in dataset.schema.names]
+        read_columns = list(dict.fromkeys(list(columns) + id_columns + ['key']))
+
+    z_df = dataset.to_table(columns=read_columns, filter=row_filter).to_pandas()
+    if drop_duplicates:
+        key_priority = list(keys) if keys is not None else sorted(z_df['key'].unique())
+        z_df = remove_duplicate_events(z_df, key_priority).reset_index(drop=True)
+        if columns is not None:
+            z_df = z_df[list(columns)]
+    return z_df
+
+
+def load_csv_folder(folder_path, pattern="*.csv", usecols=None, dtype=None,
+                    parse_dates=None, chunksize=None):
+    """
+    Load many CSV files from a folder into a single pandas DataFrame.
+
+    Parameters:
+    - folder_path: path to the folder containing CSV files
+    - pattern: glob pattern (default: '*.csv')
+    - usecols, dtype, parse_dates: forwarded to pandas.read_csv
+    - chunksize: if set, will use pandas.read_csv(..., chunksize=...) and concatenate chunks
+
+    Returns:
+    - concatenated pandas.DataFrame
+    """
+    files = sorted(glob.glob(os.path.join(folder_path, pattern)))
+    if not files:
+        raise FileNotFoundError(f"No files found in {folder_path} matching {pattern}")
+
+    frames = []
+    for f in files:
+        if chunksize:
+            for chunk in pd.read_csv(f, usecols=usecols, dtype=dtype,
+                                     parse_dates=parse_dates, chunksize=chunksize):
+                frames.append(chunk)
+        else:
+            df = pd.read_csv(f, usecols=usecols, dtype=dtype, parse_dates=parse_dates)
+            frames.append(df)
+
+    result = pd.concat(frames, ignore_index=True)
+    return result
@@ -0,0 +1,157 @@
+import os
+import json
+
+import uproot
+
+from .checksums import adler32_of_file, load_manifest, verify_files
+
+
+def unit_id(unit):
+    """ Identifier of a work unit in the manifest: '<key>:<entry_start>-<entry_stop>'. """
+    return f"{unit.key}:{unit.entry_start}-{unit.entry_stop}"
+
+
+def verify_inputs(file_paths, manifest_path, n_threads=4):
+    """
+    Verifies the input files listed in a checksum manifest (checksums.load_manifest) before they are
+    processed, n_threads files at a time, and stops at the first corrupted or missing file.
+    Raises ValueError in that case. Inputs missing from the manifest are not verified.
+    """
+    expected = load_manifest(manifest_path)
+    to_verify = {os.path.abspath(path): expected[os.path.abspath(path)]
+                 for path in file_paths if os.path.abspath(path) in expected}
+    for path in file_paths:
+        if os.path.abspath(path) not in expected:
+            print(f"WARNING: {path} is not in the checksum manifest {manifest_path}; not verified.")
+
+    failed = [result for result in verify_files(to_verify, n_threads, stop_early=True)
+              if result['status'] in ("mismatch", "missing")]
+    if failed:
+        raise ValueError(f"{failed[0]['path']}: {failed[0]['status']} (Adler-32 {failed[0]['adler32']}, expected "
+                         f"{failed[0]['expected']}). Download the file again.")
+    print(f"{len(to_verify)} input file(s) verified against {manifest_path}.")
+
+
+def check_coverage(units):
+    """
+    Checks that, for every file, the work units tile [0, num_entries) without gap or overlap,
+    so that every entry is processed exactly once. Raises ValueError otherwise.
+    """
+    ranges_by_file = {}
+    for unit in units:
+        ranges_by_file.setdefault((unit.key, unit.file_path), []).append((unit.entry_start, unit.entry_stop))
+
+    for (key, file_path), ranges in ranges_by_file.items():
+        with uproot.open(file_path) as file:
+            n_entries = file["Events"].num_entries
+
+        expected_start = 0
+        for entry_start, entry_stop in sorted(ranges):
+            if entry_start != expected_start:
+                raise ValueError(f"{key}: entries {expected_start}-{entry_start} are not covered exactly once.")
+            expected_start = entry_stop
+        if expected_start != n_entries:
+            raise ValueError(f"{key}: entries {expected_start}-{n_entries} are not covered.")
+
+
+def input_state(file_path):
+    """ Absolute path, size and modification time of an input file. """
+    stat = os.stat(file_path)
+    return {'path': os.path.abspath(file_path), 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+class RunManifest:
+    """
+    JSON record of the work units already processed, with the Adler-32 checksum of their output,
+    and of the input file of each dataset key (path, size, mtime and Adler-32 checksum) with the
+    selection settings its outputs were produced with. A restarted run skips every unit whose output
+    still exists with the recorded checksum, unless its input file or its settings changed since (update_inputs).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.units = {}
+        self.inputs = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                content = json.load(f)
+            self.units = content["units"]
+            self.inputs = content.get("inputs", {})
+
+    def update_inputs(self, files, checksum=adler32_of_file, selection=None):
+        """
+        Compares the input files {key: path} and their selection settings {key: JSON-serializable settings}
+        with the recorded ones and records them.
+        A file is only read (checksum(path)) when its path, size or modification time changed,
+        so a file that was only touched is not processed again.
+        Returns the keys whose file or settings changed: their units are forgotten, to be processed again.
+        Keys with units but no recorded input or settings (manifests of older runs) are treated as changed.
+        The manifest is not saved here: the outputs of the changed keys are removed first, then save().
+        """
+        changed = []
+        for key, file_path in files.items():
+            if not os.path.exists(file_path):
+                continue
+            state = input_state(file_path)
+            # Compared as they are read back from the JSON file (tuples become lists)
+            settings = None if selection is None else json.loads(json.dumps(selection[key]))
+            recorded = self.inputs.get(key)
+            same_file = (recorded is not None
+                         and all(recorded[name] == state[name] for name in ('path', 'size', 'mtime')))
+            same_selection = recorded is not None and recorded.get('selection') == settings
+            if same_file and same_selection:
+                continue
+
+            state['adler32'] = recorded['adler32'] if same_file else checksum(file_path)
+            same_content = (recorded is not None and recorded['path'] == state['path']
+                            and recorded['adler32'] == state['adler32'])
+            has_units = any(entry['key'] == key for entry in self.units.values())
+            if has_units and not (same_content and same_selection):
+                changed.append(key)
+                self.units = {uid: entry for uid, entry in self.units.items() if entry['key'] != key}
+            if settings is not None:
+                state['selection'] = settings
+            self.inputs[key] = state
+        return changed
+
+    def check_compatible(self, units):
+        """
+        Raises ValueError if the manifest holds ranges that are not in the current work list
+        (for example after a change of MAX_EVENTS), since their outputs would overlap the new ones.
+        """
+        current_ids = {unit_id(unit) for unit in units}
+        unknown = [uid for uid in self.units if uid not in current_ids]
+        if unknown:
+            raise ValueError(
+                f"The manifest {self.path} holds {len(unknown)} unit(s) that do not match the current "
+                f"chunking (e.g. '{unknown[0]}'). Use the same MAX_EVENTS or start a new output directory."
+            )
+
+    def is_done(self, unit):
+        """ True if the unit was recorded and its output file is intact. """
+        entry = self.units.get(unit_id(unit))
+        if entry is None or not os.path.exists(entry['output']):
+            return False
+        return adler32_of_file(entry['output']) == entry['adler32']
+
+    def record(self, unit, output, n_candidates):
+        """ Records a finished unit and saves the manifest immediately. """
+        self.units[unit_id(unit)] = {
+            'key': unit.key,
+            'file_path': unit.file_path,
+            'entry_start': unit.entry_start,
+            'entry_stop': unit.entry_stop,
+            'output': output,
+            'adler32': adler32_of_file(output),
+            'n_candidates': n_candidates,
+        }
+        self.save()
+
+    def save(self):
+        # Write then rename, so an interrupted save never corrupts the manifest.
+        # The manifest can be the first output of a run (without skim cache), before its directory exists.
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({'units': self.units, 'inputs': self.inputs}, f, indent=1)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,113 @@
+import os
+import json
+import time
+import mmap
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Adler-32 checksums of the data files (the checksums of the CERN Open Data records), and their verification
+# against a manifest: a JSON file mapping each path, relative to the directory of the manifest,
+# to the checksum shown on its record:
+#   {"12365/Run2012B_DoubleMuParked.root": "adler32:<8 hex digits>", ...}
+# The "adler32:" prefix is optional. Only the standard library is used, so the data tools
+# (data/hash_calculator.py, data/verify_checksums.py) start quickly.
+
+# Size of the blocks given to zlib.adler32. zlib releases the GIL on large blocks,
+# so several files can be checksummed at the same time by threads (verify_files).
+BLOCK_SIZE = 16 * 1024 * 1024
+
+
+def adler32_of_file(filepath, block_size=BLOCK_SIZE, stop_event=None):
+    """
+    Returns the Adler-32 checksum of a file as an 8-digit hexadecimal string.
+    The file is memory-mapped and checksummed in blocks of block_size bytes, without copies.
+    If stop_event (a threading.Event) is set while the file is read, returns None.
+    """
+    adler_value = 1
+
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        # An empty file cannot be mapped; its checksum is the initial value
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    for start in range(0, size, block_size):
+                        if stop_event is not None and stop_event.is_set():
+                            return None
+                        adler_value = zlib.adler32(view[start:start + block_size], adler_value)
+
+    # Hexadecimal format of the unsigned 32-bit value (e.g., 'c09d0234')
+    return f"{adler_value & 0xFFFFFFFF:08x}"
+
+
+def load_manifest(manifest_path):
+    """ {absolute path: expected 8-digit hexadecimal Adler-32} of a manifest. """
+    with open(manifest_path) as f:
+        entries = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    return {
+        os.path.normpath(os.path.join(base_dir, path)): checksum.lower().removeprefix("adler32:").zfill(8)
+        for path, checksum in entries.items()
+    }
+
+
+def _result(path, expected, status, adler32=None, size=None, seconds=0.0):
+    return {'path': path, 'expected': expected, 'adler32': adler32, 'size': size, 'seconds': seconds,
+            'status': status}
+
+
+def verify_file(path, expected, stop_event=None):
+    """
+    Checks one file. Returns its result: path, expected and computed 'adler32', size, seconds and
+    'status', one of "ok", "mismatch", "missing" or "skipped" (stop_event set before the end of the file).
+    """
+    if not os.path.exists(path):
+        return _result(path, expected, "missing")
+
+    start = time.perf_counter()
+    size = os.path.getsize(path)
+    checksum = adler32_of_file(path, stop_event=stop_event)
+    seconds = round(time.perf_counter() - start, 3)
+    if checksum is None:
+        return _result(path, expected, "skipped", size=size, seconds=seconds)
+    return _result(path, expected, "ok" if checksum == expected else "mismatch", checksum, size, seconds)
+
+
+def verify_files(expected_checksums, n_threads=4, stop_early=False, on_result=None):
+    """
+    Verifies the files of {path: expected Adler-32} on n_threads threads, the largest files first.
+    With stop_early, the first failure ("mismatch" or "missing") cancels the files not started yet and
+    stops the ones being read; they are reported as "skipped".
+    on_result(result) is called as soon as each file is done. Returns the results in manifest order.
+    """
+    stop_event = threading.Event() if stop_early else None
+    paths = sorted(expected_checksums, key=lambda path: -os.path.getsize(path) if os.path.exists(path) else 0)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        futures = {executor.submit(verify_file, path, expected_checksums[path], stop_event): path for path in paths}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+            result = future.result()
+            results[result['path']] = result
+            if on_result is not None:
+                on_result(result)
+            if stop_early and result['status'] in ("mismatch", "missing"):
+                stop_event.set()
+                for pending in futures:
+                    pending.cancel()
+
+    return [results.get(path, _result(path, expected, "skipped")) for path, expected in expected_checksums.items()]
+
+
+def write_results(results, output_path):
+    """ Writes the results as JSON: 'ok' (every file verified), the count of each status and the per-file results. """
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    summary = {'ok': counts.get("ok", 0) == len(results), 'counts': counts, 'files': results}
+    with open(output_path, "w") as f:
+        json.dump(summary, f, indent=1)
@@ -0,0 +1,136 @@
+import sys
+import argparse
+
+from . import config
+
+# Command line of the analysis: 'higgs run', 'higgs skim', 'higgs plot' and 'higgs fit'.
+# Each command imports its own modules when it runs, so that 'higgs --help' and the pipeline
+# never load matplotlib or scipy.
+
+
+def _data_file(text):
+    """ 'KEY=PATH' option value, as a (key, path) pair. """
+    key, separator, path = text.partition("=")
+    if not separator or not key or not path:
+        raise argparse.ArgumentTypeError(f"expected KEY=PATH, got '{text}'")
+    return key, path
+
+
+def _add_input_options(parser):
+    parser.add_argument("--data-dir", help="directory of the downloaded files and of the outputs "
+                        "(default $HIGGS_DATA_DIR, or the data/ directory of the repository)")
+    parser.add_argument("--data", type=_data_file, action="append", metavar="KEY=PATH",
+                        help="collision data file (repeatable); replaces config.DATA_FILES")
+    parser.add_argument("--output-dir", help="directory of the candidates, histograms, skims and manifest")
+
+
+def _add_run_options(parser):
+    _add_input_options(parser)
+    parser.add_argument("--workers", type=int, help=f"worker processes (default {config.N_WORKERS})")
+    parser.add_argument("--max-events", type=int, help=f"events per work unit (default {config.MAX_EVENTS})")
+    parser.add_argument("--no-mc", action="store_true", help="process the collision data only")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the skim cache")
+    parser.add_argument("--executor", choices=["processes", "dask"],
+                        help=f"backend running the chunks (default {config.EXECUTOR})")
+    parser.add_argument("--address", help="Dask scheduler address; a local cluster is started without it")
+    parser.add_argument("--verify", metavar="MANIFEST",
+                        help="verify the inputs against this Adler-32 manifest (higgs/checksums.py) first")
+    parser.add_argument("--lumi-mask", metavar="JSON", help="golden JSON of the certified luminosity sections")
+    parser.add_argument("--lumi-table", metavar="CSV", help="'brilcalc lumi --byls' table, for the luminosity report")
+
+
+def _apply_options(args):
+    """ Moves the command line options into the config module, read by the pipeline when it runs. """
+    # First, since it also sets the default input files and output directory
+    if args.data_dir:
+        config.set_data_dir(args.data_dir)
+    if args.data:
+        config.DATA_FILES = dict(args.data)
+    if args.output_dir:
+        config.set_output_dir(args.output_dir)
+    if getattr(args, "workers", None):
+        config.N_WORKERS = args.workers
+    if getattr(args, "max_events", None):
+        config.MAX_EVENTS = args.max_events
+    if getattr(args, "no_mc", False):
+        config.PROCESS_MC = False
+    if getattr(args, "no_cache", False):
+        config.USE_SKIM_CACHE = False
+    if getattr(args, "executor", None):
+        config.EXECUTOR = args.executor
+    if getattr(args, "address", None):
+        config.CLUSTER_ADDRESS = args.address
+    if getattr(args, "verify", None):
+        config.CHECKSUM_MANIFEST = args.verify
+    if getattr(args, "lumi_mask", None):
+        config.LUMI_MASK = args.lumi_mask
+    if getattr(args, "lumi_table", None):
+        config.LUMI_TABLE = args.lumi_table
+    if getattr(args, "mode", None):
+        config.PIPELINE_MODE = args.mode
+    if getattr(args, "no_checkpoint", False):
+        config.CHECKPOINT = False
+    if getattr(args, "from_histograms", False):
+        config.FROM_HISTOGRAMS = True
+
+
+def _run(args):
+    from .pipeline import run
+    run()
+
+
+def _skim(args):
+    from .pipeline import skim
+    skim()
+
+
+def _plot(args):
+    from .plotting import plot_data, plot_combined
+    if args.combined:
+        plot_combined()
+    else:
+        plot_data()
+
+
+def _fit(args):
+    from .fit import fit_candidates, N_TOYS
+    fit_candidates(n_toys=N_TOYS if args.toys is None else args.toys)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="higgs", description="H -> ZZ -> 4l analysis of the CMS Open Data.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="select the Higgs candidates of the data and MC files")
+    _add_run_options(run_parser)
+    run_parser.add_argument("--mode", choices=["events", "flat"], help="pipeline implementation (default "
+                            f"{config.PIPELINE_MODE})")
+    run_parser.add_argument("--no-checkpoint", action="store_true", help="reprocess the chunks already done")
+    run_parser.set_defaults(handler=_run)
+
+    skim_parser = commands.add_parser("skim", help="fill the skim cache, without selecting candidates")
+    _add_run_options(skim_parser)
+    skim_parser.set_defaults(handler=_skim)
+
+    plot_parser = commands.add_parser("plot", help="plot the M4l distribution of the stored candidates")
+    _add_input_options(plot_parser)
+    plot_parser.add_argument("--combined", action="store_true", help="data over the MC background and signal")
+    plot_parser.add_argument("--from-histograms", action="store_true",
+                             help="use the saved histograms instead of the candidate tables")
+    plot_parser.set_defaults(handler=_plot)
+
+    fit_parser = commands.add_parser("fit", help="fit the signal strength and mass, with the significance")
+    _add_input_options(fit_parser)
+    fit_parser.add_argument("--toys", type=int, default=None, help="background-only toys (default 10000, 0 to skip)")
+    fit_parser.set_defaults(handler=_fit)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    _apply_options(args)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import os
+
+# Settings of the analysis run. The pipeline reads them when it runs (config.NAME),
+# so they can be changed by a script or by the command line options before a run.
+
+
+def _default_data_dir():
+    """
+    Directory of the input files and, by default, of the outputs: $HIGGS_DATA_DIR when set,
+    otherwise the data/ directory of the repository checkout when the package runs from one, otherwise ./data.
+    """
+    if os.environ.get("HIGGS_DATA_DIR"):
+        return os.path.join(os.path.abspath(os.environ["HIGGS_DATA_DIR"]), "")
+    checkout_data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data")
+    if os.path.isdir(checkout_data_dir):
+        return os.path.normpath(checkout_data_dir) + os.sep
+    return os.path.join(os.path.abspath("data"), "")
+
+
+# Data directory (set_data_dir, 'higgs --data-dir' or $HIGGS_DATA_DIR to change it)
+DATA_DIR = _default_data_dir()
+
+# ROOT files downloaded, relative to DATA_DIR.
+DATA_FILE_NAMES = {
+    "DoubleMuon_B": "12365/Run2012B_DoubleMuParked.root",
+    "DoubleMuon_C": "12366/Run2012C_DoubleMuParked.root",
+    "DoubleElectron_B": "12367/Run2012B_DoubleElectron.root",
+    "DoubleElectron_C": "12368/Run2012C_DoubleElectron.root"
+}
+
+# List of the ROOT files downloaded.
+DATA_FILES = {key: DATA_DIR + name for key, name in DATA_FILE_NAMES.items()}
+
+BASE_CHUNK = DATA_DIR
+
+# Verify the input files against the Adler-32 checksums of their CERN Open Data records
+# (manifest of higgs/checksums.py, e.g. DATA_DIR + "checksums.json") before the run, on CHECKSUM_THREADS
+# threads. None skips the verification, which reads every input file once more.
+CHECKSUM_MANIFEST = None
+CHECKSUM_THREADS = 4
+
+# Also run the selection on the MC samples of the dataset registry (datasets.MC_DATASETS).
+# Their candidates and histograms are stored unweighted; weights are attached when they are read.
+# Only in the "events" mode: the "flat" mode reads a single lepton flavor chosen from the file key.
+PROCESS_MC = True
+
+# Certified luminosity: CMS golden JSON of the luminosity sections to keep in the collision data
+# (e.g. DATA_DIR + "Cert_190456-208686_8TeV_22Jan2013ReReco_Collisions12_JSON.txt"), None to keep every event.
+# With LUMI_TABLE, a 'brilcalc lumi --byls' CSV table, the run reports the integrated luminosity it processed,
+# and the MC samples are normalized to it. The certified sections seen by each chunk are kept in LUMI_DIR.
+LUMI_MASK = None
+LUMI_TABLE = None
+LUMI_DIR = BASE_CHUNK + "lumi/"
+LUMI_REPORT_PATH = BASE_CHUNK + "luminosity.json"
+
+# Candidate tables (Arrow IPC files, one partition per dataset key)
+CANDIDATES_DIR = BASE_CHUNK + "candidates/"
+
+# Cache of skimmed events (after the lepton cuts), reused while the input and cuts are unchanged
+USE_SKIM_CACHE = True
+SKIM_CACHE_DIR = BASE_CHUNK + "skims/"
+SKIM_CACHE_MAX_BYTES = 20 * 1024**3
+
+# M4l histograms (one file per chunk, merged per dataset key at the end of the run)
+HISTOGRAM_DIR = BASE_CHUNK + "histograms/"
+M4L_BINNING = (110, 70.0, 180.0) # Number of bins, low edge, high edge (GeV)
+
+# Checkpointed, incremental run: finished chunks are recorded in the manifest and skipped on restart.
+# The input file of each dataset key is recorded too (path, size, mtime, Adler-32): a new file is
+# processed alone, and a file whose content changed is processed again, its old outputs removed.
+CHECKPOINT = True
+MANIFEST_PATH = BASE_CHUNK + "candidates_manifest.json"
+
+# Per-stage timing summary of the run (wall / CPU time, peak RSS, rows, events/s)
+PROFILE_PATH = BASE_CHUNK + "stage_profile.json"
+
+# Systematic scans {parameter: values}, evaluated on the same read of the data as the nominal selection.
+# Parameters: "pt_cut", "eta_max", "iso_cut", "z_mass", "momentum_scale" (factor on the lepton pT).
+# Each variation writes its candidates and histograms to VARIATIONS_DIR/<parameter>_<value>/.
+# Only in the "events" mode. Example: {"pt_cut": [4.0, 6.0], "momentum_scale": [0.99, 1.01]}
+SYSTEMATIC_SCANS = {}
+VARIATIONS_DIR = BASE_CHUNK + "variations/"
+
+# Number of events per work unit (memory is bounded by STEP_SIZE in the "events" mode)
+MAX_EVENTS = 1000000
+
+# "events": leptons stay jagged (one list per event) through the whole selection.
+# "flat": leptons of one flavor in a LeptonTable, flat columns with the offsets of the leptons of each event.
+PIPELINE_MODE = "events"
+
+# Memory budget of one batch read inside a chunk (uproot step_size), in the "events" mode
+STEP_SIZE = "200 MB"
+
+# Threads decompressing ROOT baskets in each worker (1 = uproot's default, single thread)
+DECOMPRESSION_THREADS = 4
+
+# Read the next batch in the background while the current one goes through the selection
+PREFETCH = True
+
+# Print the per-branch read / decompression times of the first chunk of each file before the run
+REPORT_BRANCH_TIMINGS = False
+
+# Number of worker processes sharing the chunks (1 runs everything in this process)
+N_WORKERS = os.cpu_count() or 1
+
+# Backend running the work units (higgs/executors.py):
+# "processes": N_WORKERS processes of this machine.
+# "dask": a Dask cluster, the scheduler at CLUSTER_ADDRESS (e.g. "tcp://head-node:8786"),
+# or a local cluster of N_WORKERS processes started for the run when CLUSTER_ADDRESS is None.
+# Workers only send back the candidate tables and histograms of their chunks; this process writes them.
+EXECUTOR = "processes"
+CLUSTER_ADDRESS = None
+
+# Plots: binning of the M4l plots (2 GeV bins between 100 and 180 GeV), and threads filling their histograms
+PLOT_BINNING = (40, 100.0, 180.0)
+FILL_THREADS = os.cpu_count() or 1
+
+# Plot from the saved histograms instead of the candidate tables. Much faster, but an event
+# recorded in both the DoubleMuon and DoubleElectron datasets is counted in both histograms.
+FROM_HISTOGRAMS = False
+
+
+def set_output_dir(output_dir):
+    """ Moves every output of the run (candidates, skims, histograms, manifest, profile, lumi) below output_dir. """
+    global BASE_CHUNK, CANDIDATES_DIR, SKIM_CACHE_DIR, HISTOGRAM_DIR, MANIFEST_PATH, PROFILE_PATH, VARIATIONS_DIR
+    global LUMI_DIR, LUMI_REPORT_PATH
+    BASE_CHUNK = os.path.join(output_dir, "")
+    CANDIDATES_DIR = BASE_CHUNK + "candidates/"
+    SKIM_CACHE_DIR = BASE_CHUNK + "skims/"
+    HISTOGRAM_DIR = BASE_CHUNK + "histograms/"
+    MANIFEST_PATH = BASE_CHUNK + "candidates_manifest.json"
+    PROFILE_PATH = BASE_CHUNK + "stage_profile.json"
+    VARIATIONS_DIR = BASE_CHUNK + "variations/"
+    LUMI_DIR = BASE_CHUNK + "lumi/"
+    LUMI_REPORT_PATH = BASE_CHUNK + "luminosity.json"
+
+
+def set_data_dir(data_dir):
+    """ Reads the input files (DATA_FILES, MC samples) from data_dir, and moves the outputs below it. """
+    global DATA_DIR, DATA_FILES
+    DATA_DIR = os.path.join(os.path.abspath(data_dir), "")
+    DATA_FILES = {key: DATA_DIR + name for key, name in DATA_FILE_NAMES.items()}
+    set_output_dir(DATA_DIR)
+
+
+def snapshot():
+    """ {NAME: value} of all the settings, to run a worker with the settings of this process. """
+    return {name: value for name, value in globals().items() if name.isupper()}
+
+
+def restore(settings):
+    """ Sets the settings of a snapshot(). """
+    globals().update(settings)
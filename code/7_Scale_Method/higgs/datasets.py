@@ -0,0 +1,119 @@
+import os
+import json
+
+import numpy as np
+import uproot
+
+from . import config
+
+# Integrated luminosity of the Run2012B + Run2012C collision data, in pb^-1 (11.58 fb^-1)
+LUMINOSITY_PB = 11580.0
+
+# Monte Carlo samples: file (relative to config.DATA_DIR), cross section (pb), k-factor applied to the
+# cross section, and role.
+# The ZZ k-factor corrects the leading-order cross section of the qq -> ZZ samples.
+MC_DATASETS = {
+    "SMHiggsToZZTo4L": {
+        "path": "12361/SMHiggsToZZTo4L.root",
+        "cross_section_pb": 0.0065,
+        "k_factor": 1.0,
+        "role": "signal",
+    },
+    "ZZTo4mu": {
+        "path": "12362/ZZTo4mu.root",
+        "cross_section_pb": 0.077,
+        "k_factor": 1.386,
+        "role": "background",
+    },
+    "ZZTo4e": {
+        "path": "12363/ZZTo4e.root",
+        "cross_section_pb": 0.077,
+        "k_factor": 1.386,
+        "role": "background",
+    },
+    "ZZTo2e2mu": {
+        "path": "12364/ZZTo2e2mu.root",
+        "cross_section_pb": 0.18,
+        "k_factor": 1.386,
+        "role": "background",
+    },
+}
+
+# Cache of the number of generated events of each MC file, in config.DATA_DIR
+GENERATED_EVENTS_CACHE = "generated_events.json"
+
+
+def mc_path(name):
+    """ Path of the file of an MC sample, in config.DATA_DIR. """
+    return os.path.join(config.DATA_DIR, MC_DATASETS[name]["path"])
+
+
+def mc_files(role=None):
+    """ {dataset key: file path} of the MC samples, optionally only the 'signal' or 'background' ones. """
+    return {
+        name: mc_path(name) for name, info in MC_DATASETS.items()
+        if role is None or info["role"] == role
+    }
+
+
+def generated_events(file_path, cache_path=None):
+    """
+    Number of generated events of an MC file: the 'genEventCount' sum of the 'Runs' tree when present,
+    otherwise the number of entries of the 'Events' tree. The value is read once and cached
+    with the file size and modification time (in GENERATED_EVENTS_CACHE of config.DATA_DIR by default).
+    """
+    cache_path = cache_path or os.path.join(config.DATA_DIR, GENERATED_EVENTS_CACHE)
+    stat = os.stat(file_path)
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+
+    abs_path = os.path.abspath(file_path)
+    entry = cache.get(abs_path)
+    if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['n_generated']
+
+    with uproot.open(file_path) as file:
+        if "Runs" in file and "genEventCount" in file["Runs"]:
+            n_generated = int(np.sum(file["Runs"]["genEventCount"].array(library="np")))
+        else:
+            n_generated = int(file["Events"].num_entries)
+
+    cache[abs_path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'n_generated': n_generated}
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp_path, cache_path)
+    return n_generated
+
+
+def mc_weight(name, luminosity_pb=LUMINOSITY_PB):
+    """
+    Per-event weight normalizing an MC sample to the data luminosity:
+    cross section x k-factor x luminosity / generated events.
+    """
+    info = MC_DATASETS[name]
+    n_generated = generated_events(mc_path(name))
+    return info["cross_section_pb"] * info["k_factor"] * luminosity_pb / n_generated
+
+
+def weight_table(data_keys, luminosity_pb=LUMINOSITY_PB):
+    """ {dataset key: per-event weight}: 1 for the collision data keys, mc_weight for the MC samples. """
+    weights = {key: 1.0 for key in data_keys}
+    for name in MC_DATASETS:
+        if os.path.exists(mc_path(name)):
+            weights[name] = mc_weight(name, luminosity_pb)
+    return weights
+
+
+def apply_weights(z_df, weights):
+    """
+    Adds the 'weight' column to a candidate table with a 'key' column, in one vectorized lookup.
+    Raises ValueError for a dataset key without weight, instead of silently using 1.
+    """
+    missing = set(z_df['key'].unique()) - set(weights)
+    if missing:
+        raise ValueError(f"No weight known for dataset(s) {sorted(missing)}. Add them to the registry.")
+    z_df['weight'] = z_df['key'].map(weights).astype(np.float64)
+    return z_df
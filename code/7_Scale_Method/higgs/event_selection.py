@@ -0,0 +1,210 @@
+import numpy as np
+import pandas as pd
+import uproot
+import awkward as ak
+
+from .pairing import build_zz_candidates, Z_MASS
+from .profiler import profile_stage
+from .lepton_table import LEPTON_DTYPES
+
+# Branches identifying an event. 'event' alone is not unique across runs.
+EVENT_ID_BRANCHES = ["run", "luminosityBlock", "event"]
+
+# NanoAOD lepton collections and their PDG flavor
+LEPTON_COLLECTIONS = {"Muon": 13, "Electron": 11}
+
+# Per-lepton quantities, read as '<Prefix>_<field>' branches.
+LEPTON_FIELDS = {
+    "pt": "pt",
+    "eta": "eta",
+    "phi": "phi",
+    "mass": "mass",
+    "charge": "charge",
+    "iso": "pfRelIso03_all",
+}
+
+# Lepton quality cuts of apply_quality_cuts_events (pT in GeV)
+QUALITY_CUTS = {"pt_cut": 5.0, "eta_max": 2.5, "iso_cut": 0.3}
+
+# Events with fewer good leptons than this cannot give a 4l candidate and are dropped from skims
+SKIM_MIN_LEPTONS = 4
+
+
+def lepton_branches():
+    """ Branches read for the muon and electron collections, event identifiers included. """
+    return EVENT_ID_BRANCHES + [
+        f"{lepton_prefix}_{name}" for lepton_prefix in LEPTON_COLLECTIONS for name in LEPTON_FIELDS.values()
+    ]
+
+
+def iterate_events(file_path, step_size="200 MB", range_start=None, range_end=None, tree=None,
+                   decompression_executor=None):
+    """
+    Streams the muons and electrons of a file as event-structured batches.
+    Batches are sized by step_size: a memory budget such as "200 MB" (uproot.iterate
+    picks the number of entries from the branch sizes) or a number of entries.
+    Memory use therefore stays bounded whatever the size of the file or the lepton multiplicity.
+    A thread pool can be given as decompression_executor to decompress baskets in parallel.
+    Yields (entry_start, entry_stop, events) for each batch.
+    """
+    if tree is None:
+        with uproot.open(file_path) as file:
+            yield from iterate_events(file_path, step_size, range_start, range_end, tree=file["Events"],
+                                      decompression_executor=decompression_executor)
+        return
+
+    batches = tree.iterate(
+        lepton_branches(),
+        step_size=step_size,
+        entry_start=range_start,
+        entry_stop=range_end,
+        library="ak",
+        report=True,
+        decompression_executor=decompression_executor,
+        interpretation_executor=decompression_executor
+    )
+    for raw_data, report in batches:
+        yield report.tree_entry_start, report.tree_entry_stop, events_from_arrays(raw_data)
+
+
+def collection_from_arrays(raw_data, lepton_prefix, flavor_pdg):
+    """
+    Builds the jagged lepton records of one NanoAOD collection, tagged with its PDG flavor.
+    """
+    leptons = {
+        field: raw_data[f"{lepton_prefix}_{name}"] for field, name in LEPTON_FIELDS.items()
+    }
+    # Compact types (float32 kinematics, int8 charge, uint8 flavor): the four-vector sums
+    # are done in float64 by the pairing kernels, so the skims can stay small
+    leptons["flavor"] = ak.zeros_like(leptons["charge"]) + flavor_pdg
+    # Position of the lepton in its NanoAOD collection, kept through the cuts
+    leptons["index"] = ak.local_index(leptons["charge"])
+    return ak.zip({field: ak.values_astype(values, LEPTON_DTYPES[field]) for field, values in leptons.items()})
+
+
+def events_from_arrays(raw_data):
+    """
+    Builds the event-structured array from raw NanoAOD branches.
+    Muons and electrons of an event are merged in one 'leptons' list (muons first),
+    so that 4mu, 4e and 2e2mu candidates are all formed.
+    """
+    collections = [
+        collection_from_arrays(raw_data, lepton_prefix, flavor_pdg)
+        for lepton_prefix, flavor_pdg in LEPTON_COLLECTIONS.items()
+    ]
+
+    return ak.zip({
+        "run": raw_data["run"],
+        "luminosityBlock": raw_data["luminosityBlock"],
+        "event": raw_data["event"],
+        "leptons": ak.concatenate(collections, axis=1),
+    }, depth_limit=1)
+
+
+def apply_quality_cuts_events(events, pt_cut=5.0, eta_max=2.5, iso_cut=0.3):
+    """
+    Jagged version of apply_quality_cuts: keeps, inside each event,
+    the leptons passing pT > pt_cut, |eta| < eta_max and iso < iso_cut.
+    """
+    leptons = events.leptons
+    good = (leptons.pt > pt_cut) & (np.abs(leptons.eta) < eta_max) & (leptons.iso < iso_cut)
+    return ak.with_field(events, leptons[good], "leptons")
+
+
+def clean_kinematic_events(events):
+    """
+    Jagged version of clean_kinematic_data: negative masses are set to 0.1
+    and leptons with non-finite kinematics or pT <= 0 are removed.
+    """
+    leptons = events.leptons
+    # The replacement mass has the type of the column, so the skims keep float32 masses
+    corrected_mass = ak.where(leptons.mass < 0, LEPTON_DTYPES["mass"](0.1), leptons.mass)
+    leptons = ak.with_field(leptons, corrected_mass, "mass")
+
+    is_finite = (
+        np.isfinite(leptons.pt) & np.isfinite(leptons.eta) &
+        np.isfinite(leptons.phi) & np.isfinite(leptons.mass)
+    )
+    valid = is_finite & (leptons.pt > 0)
+    return ak.with_field(events, leptons[valid], "leptons")
+
+
+def select_four_lepton_events(events, min_leptons=SKIM_MIN_LEPTONS):
+    """
+    Jagged version of group_leptons_by_event_with_diagnostic_data.
+    Returns (events with at least min_leptons leptons, two of each charge, events with
+    at least min_leptons leptons before the charge cut). The two-of-each-charge cut is the zero net
+    charge cut of 4-lepton events extended to events with more leptons: without it no neutral
+    quadruplet can be formed.
+    """
+    events_before_charge_cut = events[ak.num(events.leptons) >= min_leptons]
+
+    charges = events_before_charge_cut.leptons.charge
+    two_of_each_charge = (ak.sum(charges > 0, axis=1) >= 2) & (ak.sum(charges < 0, axis=1) >= 2)
+    return events_before_charge_cut[two_of_each_charge], events_before_charge_cut
+
+
+def skim_events(events, cuts=QUALITY_CUTS, min_leptons=SKIM_MIN_LEPTONS, profiler=None):
+    """
+    Lepton-level part of the selection: quality cuts and kinematic cleaning.
+    Events left with fewer than min_leptons leptons are dropped, which keeps skims small.
+    Each step is timed when a StageProfiler is given.
+    """
+    with profile_stage(profiler, "apply_quality_cuts") as record:
+        record.events = len(events)
+        record.rows_in = int(ak.count(events.leptons.pt))
+        events = apply_quality_cuts_events(events, **cuts)
+        record.rows_out = int(ak.count(events.leptons.pt))
+
+    with profile_stage(profiler, "clean_kinematic_data") as record:
+        record.events = len(events)
+        record.rows_in = int(ak.count(events.leptons.pt))
+        events = clean_kinematic_events(events)
+        events = events[ak.num(events.leptons) >= min_leptons]
+        record.rows_out = int(ak.count(events.leptons.pt))
+    return events
+
+
+def select_higgs_candidates(events, profiler=None, z_mass=Z_MASS):
+    """
+    Event-level part of the selection, on skimmed events: 4l / charge selection and the best ZZ
+    candidate of each event (build_zz_candidates), also for events with more than four leptons.
+    """
+    with profile_stage(profiler, "group_leptons_by_event") as record:
+        record.events = record.rows_in = len(events)
+        four_lepton_events, _ = select_four_lepton_events(events)
+        record.rows_out = len(four_lepton_events)
+
+    with profile_stage(profiler, "find_z_candidates") as record:
+        record.events = record.rows_in = len(four_lepton_events)
+        result = build_zz_candidates(four_lepton_events.leptons, z_mass)
+        selected = result['selected']
+        selected_events = four_lepton_events[selected]
+
+        # Convert the per-event positions of the four leptons into NanoAOD collection indices
+        counts = ak.to_numpy(ak.num(selected_events.leptons))
+        starts = np.cumsum(counts) - counts
+        flat_positions = starts[:, None] + result['l_indices'][selected]
+        l_indices = ak.to_numpy(ak.flatten(selected_events.leptons.index))[flat_positions]
+        # The flavor of each Z tells which collection its indices refer to (and the 4mu / 4e / 2e2mu channel)
+        l_flavors = ak.to_numpy(ak.flatten(selected_events.leptons.flavor))[flat_positions]
+
+        z_df = pd.DataFrame({
+            'run': ak.to_numpy(selected_events.run),
+            'luminosityBlock': ak.to_numpy(selected_events.luminosityBlock),
+            'event_id': ak.to_numpy(selected_events.event),
+            'z1_mass': result['z1_mass'][selected],
+            'z2_mass': result['z2_mass'][selected],
+            'mass': result['mass'][selected],
+            'z1_flavor': l_flavors[:, 0],
+            'z2_flavor': l_flavors[:, 2],
+            'l1_idx': l_indices[:, 0],
+            'l2_idx': l_indices[:, 1],
+            'l3_idx': l_indices[:, 2],
+            'l4_idx': l_indices[:, 3],
+        })
+        record.rows_out = len(z_df)
+
+    print(f"\nTotal events with at least two SFOS pairs (Z1+Z2) : {len(z_df)}")
+    return z_df
+
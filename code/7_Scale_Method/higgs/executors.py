@@ -0,0 +1,89 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import config
+
+# Backends running the work units of a run. An executor runs fn(item) for every item and yields
+# the (item, result) pairs in completion order; fn, the items and the results are pickled,
+# so fn must be a module-level function (or a functools.partial of one).
+
+
+def call_with_config(settings, fn, item):
+    """
+    Runs fn(item) with the config settings of the driver process (config.snapshot()).
+    Workers that were not forked from the driver (Dask workers, other nodes) start
+    from the defaults of higgs/config.py and would miss the changes made by a script or the CLI.
+    """
+    config.restore(settings)
+    return fn(item)
+
+
+class LocalExecutor:
+    """ Work units on n_workers processes of this machine. """
+
+    def __init__(self, n_workers, initializer=None):
+        self.n_workers = n_workers
+        self.initializer = initializer
+
+    def map_unordered(self, fn, items):
+        with ProcessPoolExecutor(max_workers=self.n_workers, initializer=self.initializer) as executor:
+            futures = {executor.submit(fn, item): item for item in items}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def close(self):
+        pass
+
+
+class DaskExecutor:
+    """
+    Work units on a Dask cluster: the scheduler at address (e.g. a batch farm running 'dask worker'
+    on each node), or, without address, a LocalCluster of n_workers processes started on this machine.
+    The workers need the higgs package and read access to the input files, at the same paths.
+    """
+
+    def __init__(self, n_workers, address=None):
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError:
+            raise ImportError('EXECUTOR = "dask" needs dask.distributed: pip install "dask[distributed]"')
+
+        self.cluster = None
+        if address is None:
+            self.cluster = LocalCluster(n_workers=n_workers, threads_per_worker=1, processes=True,
+                                        dashboard_address=None)
+            self.client = Client(self.cluster)
+        else:
+            self.client = Client(address)
+
+    def map_unordered(self, fn, items):
+        from dask.distributed import as_completed as dask_as_completed
+
+        items = list(items)
+        # pure=False: a unit is processed again if it is submitted again (it may have changed on disk)
+        futures = self.client.map(fn, items, pure=False)
+        item_of = {future.key: item for future, item in zip(futures, items)}
+        for future in dask_as_completed(futures):
+            result = future.result()
+            # The result is no longer kept by the cluster once it is here
+            future.release()
+            yield item_of[future.key], result
+
+    def close(self):
+        self.client.close()
+        if self.cluster is not None:
+            self.cluster.close()
+
+
+def make_executor(name=None, n_workers=None, address=None, initializer=None):
+    """
+    Executor of config.EXECUTOR ("processes" or "dask"), with config.N_WORKERS workers
+    and config.CLUSTER_ADDRESS, unless given here.
+    """
+    name = name or config.EXECUTOR
+    n_workers = n_workers or config.N_WORKERS
+    address = address or config.CLUSTER_ADDRESS
+    if name == "processes":
+        return LocalExecutor(n_workers, initializer)
+    if name == "dask":
+        return DaskExecutor(n_workers, address)
+    raise ValueError(f"Unknown executor '{name}'. Use \"processes\" or \"dask\".")
@@ -0,0 +1,216 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import optimize, stats
+from scipy.special import xlogy
+
+# Mass of the simulated Higgs signal sample (GeV); other mass hypotheses shift its template
+SIGNAL_MASS = 125.0
+
+# Expected background of a bin is at least this, so that a data event never has zero probability
+BACKGROUND_FLOOR = 1e-6
+
+# Fit of the stored candidates (fit_candidates): 1 GeV bins around the peak, scanned masses, toys
+FIT_BINNING = (80, 100.0, 180.0)
+SCAN_MASSES = np.arange(110.0, 150.5, 0.5)
+N_TOYS = 10000
+
+
+def shift_template(signal_hist, shifts):
+    """
+    Signal templates moved by each mass shift (GeV), as an (n_shifts, n_bins) array.
+    The template is taken as uniform inside each bin, so a shift smaller than a bin moves
+    the right fraction of every bin into its neighbour. The normalization is kept,
+    except for the part moved outside the histogram range.
+    """
+    edges = signal_hist.edges
+    cumulative = np.concatenate([[0.0], np.cumsum(signal_hist.sum_w)])
+    shifted_edges = edges[None, :] - np.asarray(shifts, dtype=np.float64)[:, None]
+    return np.diff(np.interp(shifted_edges, edges, cumulative), axis=1)
+
+
+def poisson_nll(n, nu):
+    """ Binned Poisson negative log-likelihood (without the constant log n! term), summed over the last axis. """
+    return np.sum(nu - xlogy(n, nu), axis=-1)
+
+
+def fit_mu(n, signal, background, mu_min=0.0, n_iter=50, tolerance=1e-9):
+    """
+    Best signal strength mu of the model nu = mu * signal + background, for observed counts n.
+    All arrays broadcast on their leading axes and have the bins on the last axis, so one call fits
+    every (toy, mass hypothesis) combination at once. The likelihood is convex in mu, and Newton
+    steps started from mu = 1 approach the minimum from below after the first step.
+    mu is kept above mu_min (0: no negative signal).
+    """
+    n = np.asarray(n, dtype=np.float64)
+    shape = np.broadcast_shapes(n.shape, signal.shape, background.shape)[:-1]
+    mu = np.ones(shape)
+    for _ in range(n_iter):
+        nu = mu[..., None] * signal + background
+        ratio = n / nu
+        gradient = np.sum(signal * (1 - ratio), axis=-1)
+        hessian = np.sum(signal**2 * ratio / nu, axis=-1)
+        # Without data in the signal bins the likelihood only decreases with mu: go to mu_min
+        new_mu = np.where(hessian > 0, mu - gradient / np.where(hessian > 0, hessian, 1), mu_min)
+        new_mu = np.maximum(new_mu, mu_min)
+        converged = np.all(np.abs(new_mu - mu) < tolerance)
+        mu = new_mu
+        if converged:
+            break
+    return mu
+
+
+def _discovery_q0(n, templates, background):
+    """ (mu_hat, q0) of each template: q0 = 2 (NLL(mu=0) - NLL(mu_hat)), with mu_hat >= 0. """
+    mu_hat = fit_mu(n, templates, background)
+    nll_hat = poisson_nll(n, mu_hat[..., None] * templates + background)
+    nll_zero = poisson_nll(n, background)
+    return mu_hat, np.maximum(2 * (nll_zero - nll_hat), 0.0)
+
+
+def _model(data_hist, signal_hist, background_hist, masses):
+    """ Observed counts, the signal template of every mass hypothesis, and the floored background. """
+    for hist in (signal_hist, background_hist):
+        data_hist._check_compatible(hist)
+    templates = shift_template(signal_hist, np.asarray(masses, dtype=np.float64) - SIGNAL_MASS)
+    background = np.maximum(background_hist.sum_w, BACKGROUND_FLOOR)
+    return data_hist.sum_w, templates, background
+
+
+def significance_scan(data_hist, signal_hist, background_hist, masses):
+    """
+    Local significance of a signal at each mass hypothesis, all computed in one vectorized fit.
+    Returns a dictionary of arrays: 'mass', 'mu_hat', 'q0', 'z_local' (asymptotic, sqrt(q0))
+    and 'p_local'.
+    """
+    n, templates, background = _model(data_hist, signal_hist, background_hist, masses)
+    mu_hat, q0 = _discovery_q0(n, templates, background)
+    z_local = np.sqrt(q0)
+    return {
+        'mass': np.asarray(masses, dtype=np.float64),
+        'mu_hat': mu_hat,
+        'q0': q0,
+        'z_local': z_local,
+        'p_local': stats.norm.sf(z_local),
+    }
+
+
+def fit_signal(data_hist, signal_hist, background_hist, mass_range=(110.0, 140.0), mass_step=0.1):
+    """
+    Binned maximum-likelihood fit of the signal strength mu and the Higgs mass.
+    mu is profiled on a fine grid of masses, then the best mass is refined by a 1D minimization.
+    Errors are the 2 delta NLL = 1 interval of the profile for the mass, and the curvature for mu.
+    """
+    def profile(masses):
+        n, templates, background = _model(data_hist, signal_hist, background_hist, masses)
+        mu_hat = fit_mu(n, templates, background)
+        return mu_hat, poisson_nll(n, mu_hat[..., None] * templates + background)
+
+    masses = np.arange(mass_range[0], mass_range[1] + mass_step / 2, mass_step)
+    mu_grid, nll_grid = profile(masses)
+    best = np.argmin(nll_grid)
+
+    refined = optimize.minimize_scalar(
+        lambda mass: profile([mass])[1][0],
+        bounds=(masses[max(best - 1, 0)], masses[min(best + 1, len(masses) - 1)]),
+        method="bounded",
+    )
+    mass_hat = refined.x
+    mu_hat, nll_hat = (values[0] for values in profile([mass_hat]))
+
+    n, templates, background = _model(data_hist, signal_hist, background_hist, [mass_hat])
+    nu = mu_hat * templates[0] + background
+    mu_curvature = np.sum(templates[0]**2 * n / nu**2)
+    mu_error = 1 / np.sqrt(mu_curvature) if mu_curvature > 0 else np.inf
+
+    inside = masses[2 * (nll_grid - nll_hat) <= 1.0]
+    return {
+        'mu': mu_hat,
+        'mu_error': mu_error,
+        'mass': mass_hat,
+        'mass_interval': (inside.min(), inside.max()) if len(inside) else (np.nan, np.nan),
+        'nll': nll_hat,
+        'scan_mass': masses,
+        'scan_mu': mu_grid,
+        'scan_nll': nll_grid,
+    }
+
+
+def _toy_block(task):
+    """ Max and per-mass q0 of a block of background-only pseudo-experiments. Runs in a worker process. """
+    seed, n_toys, templates, background = task
+    rng = np.random.default_rng(seed)
+    toys = rng.poisson(background, size=(n_toys, len(background))).astype(np.float64)
+    _, q0 = _discovery_q0(toys[:, None, :], templates[None, :, :], background)
+    return q0
+
+
+def run_toys(data_hist, signal_hist, background_hist, masses, n_toys=10000, n_workers=None,
+             block_size=500, seed=0):
+    """
+    Background-only pseudo-experiments for the p-value calibration of significance_scan.
+    Toys are generated and fitted in vectorized blocks spread over n_workers processes,
+    each block with its own independent random stream (SeedSequence.spawn), so the result
+    does not depend on the number of workers.
+    Returns 'q0' (n_toys, n_masses), and the local and global (look-elsewhere) p-values
+    of the observed scan: the fraction of toys with a q0 at the best mass, or a max q0 over
+    all masses, at least as large as observed.
+    """
+    n, templates, background = _model(data_hist, signal_hist, background_hist, masses)
+    n_workers = n_workers or os.cpu_count() or 1
+
+    block_sizes = [min(block_size, n_toys - start) for start in range(0, n_toys, block_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(block_sizes))
+    tasks = [(block_seed, size, templates, background) for block_seed, size in zip(seeds, block_sizes)]
+
+    if n_workers <= 1:
+        blocks = [_toy_block(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            blocks = list(executor.map(_toy_block, tasks))
+    q0 = np.concatenate(blocks)
+
+    _, observed_q0 = _discovery_q0(n, templates, background)
+    best = np.argmax(observed_q0)
+    return {
+        'q0': q0,
+        'observed_q0': observed_q0,
+        'p_local': np.mean(q0[:, best] >= observed_q0[best]),
+        'p_global': np.mean(q0.max(axis=1) >= observed_q0[best]),
+    }
+
+
+def fit_candidates(n_toys=N_TOYS):
+    """
+    Fits the stored data candidates with the MC templates (FIT_BINNING), scans the local
+    significance over SCAN_MASSES and runs n_toys background-only toys. Prints the results.
+    """
+    from .config import DATA_FILES
+    from .datasets import mc_files, weight_table
+    from .results import load_weighted_candidates, weighted_histogram
+    from .lumi_mask import analysis_luminosity_pb
+
+    z_df = load_weighted_candidates(weight_table(DATA_FILES.keys(), analysis_luminosity_pb()))
+    data_hist = weighted_histogram(z_df[z_df['key'].isin(DATA_FILES.keys())], FIT_BINNING)
+    background_hist = weighted_histogram(z_df[z_df['key'].isin(mc_files("background").keys())], FIT_BINNING)
+    signal_hist = weighted_histogram(z_df[z_df['key'].isin(mc_files("signal").keys())], FIT_BINNING)
+
+    result = fit_signal(data_hist, signal_hist, background_hist)
+    print(f"Signal strength mu = {result['mu']:.2f} +/- {result['mu_error']:.2f}")
+    print(f"Higgs mass = {result['mass']:.2f} GeV, 2 delta NLL < 1 for "
+          f"[{result['mass_interval'][0]:.1f}, {result['mass_interval'][1]:.1f}] GeV")
+
+    scan = significance_scan(data_hist, signal_hist, background_hist, SCAN_MASSES)
+    best = np.argmax(scan['z_local'])
+    print(f"Largest local significance: {scan['z_local'][best]:.2f} sigma at {scan['mass'][best]:.1f} GeV")
+
+    if n_toys:
+        toys = run_toys(data_hist, signal_hist, background_hist, SCAN_MASSES, n_toys=n_toys)
+        print(f"{n_toys} background-only toys: local p-value {toys['p_local']:.2e}, "
+              f"global p-value {toys['p_global']:.2e}")
+    return result
+
+
+if __name__ == "__main__":
+    fit_candidates()
@@ -0,0 +1,290 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import uproot # For reading CERN ROOT files
+
+from .pairing import Z_MASS, build_zz_candidates
+from .lepton_table import LeptonTable
+from .profiler import profile_stage
+
+# The "flat" pipeline mode: leptons of one flavor, in a flat LeptonTable with per-event offsets.
+# find_z_candidates is the readable loop version of the Z1/Z2 pairing, kept as the reference of pairing.py.
+
+# Columns of the candidate tables of the "flat" mode: the full record of the "events" mode
+# (candidate_store.CANDIDATE_SCHEMA), so that the candidates of both modes are read and deduplicated the same way.
+CANDIDATE_COLUMNS = ['run', 'luminosityBlock', 'event_id', 'z1_mass', 'z2_mass', 'mass',
+                     'z1_flavor', 'z2_flavor', 'l1_idx', 'l2_idx', 'l3_idx', 'l4_idx']
+
+# Necessary branches (columns) for each lepton type. run and luminosityBlock are kept for the lumi mask.
+MUON_BRANCHES = ["run", "luminosityBlock", "event", "Muon_pt", "Muon_eta", "Muon_phi", "Muon_mass", "Muon_charge", "Muon_pfRelIso03_all"]
+ELECTRON_BRANCHES = ["run", "luminosityBlock", "event", "Electron_pt", "Electron_eta", "Electron_phi", "Electron_mass", "Electron_charge", "Electron_pfRelIso03_all"]
+
+
+def load_data_from_file(file_path, file_key, range_start, range_end, tree=None):
+    """
+    Loads specific lepton data (Muon or Electron) based on the trigger file type (file_key).
+    Returns a compact LeptonTable for that file (float32 kinematics, int8 charge, uint8 flavor,
+    per-event offsets instead of an event_id repeated for every lepton), or None.
+    An already opened 'Events' tree can be passed to avoid reopening the file for every chunk.
+    """
+
+    # 1. Determine the branches to load based on the trigger type
+    if ("DoubleMuon" in file_key) or ("4mu" in file_key):
+        lepton_prefix = "Muon"  # Capitalized to match branch names
+        branches = MUON_BRANCHES
+        flavor_pdg = 13 # Muon
+    elif ("DoubleElectron" in file_key) or ("4e" in file_key):
+        lepton_prefix = "Electron" # Capitalized to match branch names
+        branches = ELECTRON_BRANCHES
+        flavor_pdg = 11 # Electron
+    else:
+        print(f"Warning: Unrecognized file type ({file_key}). Skipped.")
+        return None
+
+    try:
+        # Open the ROOT file and read the 'Events' tree (TTree), unless an open tree is given
+        if tree is None:
+            with uproot.open(file_path) as file:
+                return load_data_from_file(file_path, file_key, range_start, range_end, tree=file["Events"])
+
+        # Read only the necessary branches for this file
+        raw_data = tree.arrays(
+            branches,
+            entry_start=range_start,
+            entry_stop=range_end,
+            library="ak"
+        )
+    except Exception as e:
+        # Leave a clearer message for the user
+        print(f"\nERROR: Could not load file {file_path}. Does the file exist and contain an 'Events' TTree?")
+        print(f"Error details: {e}")
+        return None
+
+    # The lepton columns are copied once from the ROOT arrays, in their compact types
+    return LeptonTable.from_arrays(raw_data, {lepton_prefix: flavor_pdg})
+
+
+def apply_quality_cuts(leptons):
+    """
+    Applies the minimal quality and kinematic cuts to individual leptons.
+    This is the first essential filtering step in the H -> 4l analysis.
+    The LeptonTable is masked in place (one mask, no copy of the table) and returned.
+    """
+
+    # A. KINEMATIC CUT ON PT (Transverse Momentum)
+    pt_cut = 5.0
+    # B. ACCEPTANCE CUT ON ETA (Pseudorapidity)
+    eta_max = 2.5
+    # C. ISOLATION CUT (Rejecting Leptons from Jets)
+    iso_cut = 0.3
+
+    good = (leptons['pt'] > pt_cut) & (np.abs(leptons['eta']) < eta_max) & (leptons['iso'] < iso_cut)
+    return leptons.mask(good)
+
+
+def clean_kinematic_data(leptons):
+    """
+    Corrects negative masses (reconstruction fault) and removes leptons with invalid values,
+    in place on the LeptonTable.
+    """
+    kinematic_cols = ['pt', 'eta', 'phi', 'mass']
+
+    # 1. CORRECTION: Identify and correct negative masses (the main problem)
+    mass = leptons['mass']
+    mass[mass < 0] = 0.1
+
+    # 2. CLEANUP: Mask for NaN/Inf (all columns must be finite)
+    is_finite = np.logical_and.reduce([np.isfinite(leptons[col]) for col in kinematic_cols])
+
+    # 3. CLEANUP: Mask for pT > 0 (mass is now >= 0 thanks to step 1)
+    valid_mask = is_finite & (leptons['pt'] > 0)
+    return leptons.mask(valid_mask)
+
+
+def group_leptons_by_event_with_diagnostic_data(leptons):
+    """
+    Keeps the events that can give a H -> 4l candidate (at least 4 leptons, two of each charge), in place,
+    from the per-event lepton counts of the LeptonTable (no groupby).
+    Returns the table and, for diagnostics, the number of 4+ lepton events before the charge cut.
+    """
+    four_leptons = leptons.counts >= 4
+    two_of_each_charge = (
+        (leptons.event_sum(leptons['charge'] > 0) >= 2) & (leptons.event_sum(leptons['charge'] < 0) >= 2)
+    )
+    n_before_charge_cut = int(np.count_nonzero(four_leptons))
+
+    return leptons.select_events(four_leptons & two_of_each_charge), n_before_charge_cut
+
+
+def find_z_candidates_table(leptons):
+    """
+    Best ZZ candidate of each event of a LeptonTable (build_zz_candidates, as in the events mode),
+    without rebuilding the events from a DataFrame.
+    Returns the CANDIDATE_COLUMNS DataFrame, one row per selected event.
+    """
+    if leptons.n_events == 0:
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+
+    result = build_zz_candidates(leptons.to_awkward())
+    selected = result['selected']
+
+    # Rows of the four leptons in the table, from their positions in each event, and their collection indices
+    rows = leptons.offsets[:-1][selected, None] + result['l_indices'][selected]
+    l_indices = leptons.columns['index'][rows]
+    l_flavors = leptons.columns['flavor'][rows]
+
+    z_df = pd.DataFrame({
+        'run': leptons.events['run'][selected],
+        'luminosityBlock': leptons.events['luminosityBlock'][selected],
+        'event_id': leptons.events['event'][selected],
+        'z1_mass': result['z1_mass'][selected],
+        'z2_mass': result['z2_mass'][selected],
+        'mass': result['mass'][selected],
+        'z1_flavor': l_flavors[:, 0],
+        'z2_flavor': l_flavors[:, 2],
+        'l1_idx': l_indices[:, 0],
+        'l2_idx': l_indices[:, 1],
+        'l3_idx': l_indices[:, 2],
+        'l4_idx': l_indices[:, 3],
+    })
+
+    print(f"\nTotal events with at least two SFOS pairs (Z1+Z2) : {len(z_df)}")
+    return z_df
+
+
+def find_z_candidates(df):
+    """
+    Finds the Z1 and Z2 candidates using Lorentz vectors (df['lv']).
+    This is where the M4l (Higgs mass) calculation is performed.
+    """
+    z_candidates = []
+    df_lite = df.drop(columns=['lv']) if 'lv' in df.columns else df
+    
+    df_lite['original_index'] = df_lite.index
+    
+    grouped = df_lite.groupby('event_id')
+    
+    for event_id, leptons_in_event in grouped:
+        
+        sfos_pairs = []
+        
+         # 1. Find all SFOS (Same-Flavor, Opposite-Sign) pairs
+        for l1_idx, l2_idx in combinations(leptons_in_event.index, 2):
+            l1 = leptons_in_event.loc[l1_idx]
+            l2 = leptons_in_event.loc[l2_idx]
+            
+            # SFOS Condition (Same Flavor, Opposite Sign)
+            if (l1['flavor'] == l2['flavor']) and (l1['charge'] * l2['charge'] < 0):
+
+                try:
+                    # Retrieve Lorentz vectors from the original DataFrame
+                    l1_lv = df.loc[l1_idx, 'lv']
+                    l2_lv = df.loc[l2_idx, 'lv']
+                    # Using Lorentz vector addition to calculate the pair's four-vector
+                    l_pair = l1_lv + l2_lv
+                    m_inv = l_pair.mass
+                except Exception as e:
+                    continue 
+
+                # Cleaning up NaNs or Infs resulting from vector addition
+                if not np.isfinite(m_inv):
+                    continue
+
+                sfos_pairs.append({
+                    'mass': m_inv,
+                    'l1_idx': l1_idx,
+                    'l2_idx': l2_idx,
+                    'abs_diff_z': np.abs(m_inv - Z_MASS) # Critère Z1
+                })
+        
+        if len(sfos_pairs) < 2:
+            continue 
+
+        # 2. Select the Z1 candidate (closest to M_Z) 
+        sfos_pairs.sort(key=lambda x: x['abs_diff_z'])
+        z1_candidate = sfos_pairs[0]
+        
+        used_indices = {z1_candidate['l1_idx'], z1_candidate['l2_idx']}
+
+        # 3. Select the Z2 candidate
+        
+        best_z1_combo = None
+        min_total_diff = np.inf
+        
+        # Iterate over ALL SFOS pairs to find the best orthogonal Z2
+        for pair_z2 in sfos_pairs:
+            
+            # Z2 must not share a lepton with Z1
+            z2_indices = {pair_z2['l1_idx'], pair_z2['l2_idx']}
+            if len(used_indices.intersection(z2_indices)) == 0:
+                
+                # Calculate optimization metric (Minimize |M_Z1 - M_Z| + |M_Z2 - M_Z|)
+                current_total_diff = z1_candidate['abs_diff_z'] + pair_z2['abs_diff_z']
+                
+                # We search for the best orthogonal pair remaining which minimizes the total deviation (D).
+                
+                if current_total_diff < min_total_diff:
+                    min_total_diff = current_total_diff
+                    best_z1_combo = {
+                        'z1': z1_candidate,
+                        'z2': pair_z2
+                    }
+
+                
+        if best_z1_combo:
+
+            z1_candidate = best_z1_combo['z1']
+            z2_candidate = best_z1_combo['z2']
+            
+            # Retrieve the 4 Lorentz vectors for the final leptons
+            l1_lv = df.loc[z1_candidate['l1_idx'], 'lv']
+            l2_lv = df.loc[z1_candidate['l2_idx'], 'lv'] 
+            l3_lv = df.loc[z2_candidate['l1_idx'], 'lv']
+            l4_lv = df.loc[z2_candidate['l2_idx'], 'lv']
+            
+            # Calculate Higgs Mass (M4l)
+            h_lv = l1_lv + l2_lv + l3_lv + l4_lv
+            h_mass = h_lv.mass
+            
+            if not np.isfinite(h_mass):
+                continue
+            
+            z_candidates.append({
+                'event_id': event_id,
+                'z1_mass': z1_candidate['mass'],
+                'z2_mass': z2_candidate['mass'],
+                'mass': h_mass, 
+                'l_indices': list(used_indices) + [z2_candidate['l1_idx'], z2_candidate['l2_idx']]
+            })
+
+    z_df = pd.DataFrame(z_candidates)
+    
+    print(f"\nTotal events with at least two SFOS pairs (Z1+Z2) : {len(z_df)}")
+    z_df = z_df[['event_id', 'mass']]
+    return z_df
+
+def get_higgs_candidates(leptons, profiler=None):
+    """ Flat selection chain on a LeptonTable (modified in place): cuts, cleaning, 4l selection and pairing. """
+    if leptons is None:
+        return pd.DataFrame(columns=CANDIDATE_COLUMNS)
+
+    with profile_stage(profiler, "apply_quality_cuts") as record:
+        record.rows_in = len(leptons)
+        apply_quality_cuts(leptons)
+        record.rows_out = len(leptons)
+    with profile_stage(profiler, "clean_kinematic_data") as record:
+        record.rows_in = len(leptons)
+        clean_kinematic_data(leptons)
+        record.rows_out = len(leptons)
+    # The columnar pairing works directly on the kinematic columns, no 'lv' object column is needed
+    with profile_stage(profiler, "group_leptons_by_event") as record:
+        record.rows_in = len(leptons)
+        group_leptons_by_event_with_diagnostic_data(leptons)
+        record.rows_out = len(leptons)
+
+    with profile_stage(profiler, "find_z_candidates") as record:
+        record.rows_in = len(leptons)
+        z_df = find_z_candidates_table(leptons)
+        record.rows_out = len(z_df)
+    return z_df
@@ -0,0 +1,181 @@
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# Smallest number of values given to one thread by a parallel fill
+MIN_BLOCK_SIZE = 1_000_000
+
+
+class Histogram:
+    """
+    Weighted histogram with fixed bin edges, filled incrementally.
+    It keeps the sum of weights and the sum of squared weights of each bin,
+    so the statistical error of a weighted (MC) histogram is sqrt(sum_w2).
+    Histograms with the same edges are merged by addition (h1 + h2).
+    """
+
+    def __init__(self, edges, sum_w=None, sum_w2=None):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        n_bins = len(self.edges) - 1
+        self.sum_w = np.zeros(n_bins) if sum_w is None else np.asarray(sum_w, dtype=np.float64)
+        self.sum_w2 = np.zeros(n_bins) if sum_w2 is None else np.asarray(sum_w2, dtype=np.float64)
+
+    @classmethod
+    def regular(cls, n_bins, low, high):
+        """ Histogram with n_bins bins of equal width between low and high. """
+        return cls(np.linspace(low, high, n_bins + 1))
+
+    @property
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    @property
+    def errors(self):
+        """ Statistical error of each bin (sqrt(N) for unit weights). """
+        return np.sqrt(self.sum_w2)
+
+    def _bins_inside(self, values):
+        """
+        (inside, bins): the mask of the values within the edges, and the bin of each of these values.
+        As in np.histogram, bins include their lower edge and the last bin also includes the upper edge;
+        NaN values are outside.
+        """
+        n_bins = len(self.sum_w)
+        low, high = self.edges[0], self.edges[-1]
+        inside = (values >= low) & (values <= high)
+        x = values[inside]
+
+        widths = np.diff(self.edges)
+        if np.allclose(widths, widths[0], rtol=1e-9, atol=0):
+            # Regular bins: the bin follows from one multiplication, much faster than a binary search
+            bins = ((x - low) * (n_bins / (high - low))).astype(np.int64)
+            np.clip(bins, 0, n_bins - 1, out=bins)
+            # Rounding can put a value lying on an edge in the neighbouring bin
+            bins -= x < self.edges[bins]
+            bins += (x >= self.edges[bins + 1]) & (bins != n_bins - 1)
+        else:
+            bins = np.searchsorted(self.edges, x, side='right') - 1
+            bins[bins == n_bins] = n_bins - 1
+        return inside, bins
+
+    def _partial_sums(self, values, weights):
+        """ (sum_w, sum_w2) of one block of values, computed in a single pass over the block. """
+        n_bins = len(self.sum_w)
+        inside, bins = self._bins_inside(values)
+        if weights is None:
+            counts = np.bincount(bins, minlength=n_bins).astype(np.float64)
+            return counts, counts
+        weights = weights[inside]
+        return (np.bincount(bins, weights=weights, minlength=n_bins),
+                np.bincount(bins, weights=weights * weights, minlength=n_bins))
+
+    def fill(self, values, weights=None, n_threads=1):
+        """
+        Adds values (and their weights, 1 by default) to the histogram. Values outside the edges are ignored.
+        With n_threads > 1, large inputs are split in blocks filled by a pool of threads
+        (the NumPy binning releases the GIL), and the partial histograms are added up.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if weights is not None:
+            weights = np.asarray(weights, dtype=np.float64)
+            if len(weights) != len(values):
+                raise ValueError(f"Got {len(weights)} weights for {len(values)} values.")
+
+        n_blocks = max(1, min(n_threads, len(values) // MIN_BLOCK_SIZE))
+        if n_blocks == 1:
+            partials = [self._partial_sums(values, weights)]
+        else:
+            bounds = np.linspace(0, len(values), n_blocks + 1).astype(np.int64)
+            blocks = [
+                (values[start:stop], None if weights is None else weights[start:stop])
+                for start, stop in zip(bounds[:-1], bounds[1:])
+            ]
+            with ThreadPoolExecutor(max_workers=n_blocks) as pool:
+                partials = list(pool.map(lambda block: self._partial_sums(*block), blocks))
+
+        for sum_w, sum_w2 in partials:
+            self.sum_w += sum_w
+            self.sum_w2 += sum_w2
+        return self
+
+    def _check_compatible(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bin edges.")
+
+    def __add__(self, other):
+        self._check_compatible(other)
+        return Histogram(self.edges, self.sum_w + other.sum_w, self.sum_w2 + other.sum_w2)
+
+    def __iadd__(self, other):
+        self._check_compatible(other)
+        self.sum_w += other.sum_w
+        self.sum_w2 += other.sum_w2
+        return self
+
+    def scale(self, factor):
+        """ Histogram with every weight multiplied by factor (e.g. a normalization). """
+        return Histogram(self.edges, self.sum_w * factor, self.sum_w2 * factor**2)
+
+    def rebin(self, factor):
+        """ Histogram with groups of `factor` neighbouring bins merged. """
+        n_bins = len(self.sum_w)
+        if n_bins % factor != 0:
+            raise ValueError(f"Cannot merge {n_bins} bins by groups of {factor}.")
+        return Histogram(
+            self.edges[::factor],
+            self.sum_w.reshape(-1, factor).sum(axis=1),
+            self.sum_w2.reshape(-1, factor).sum(axis=1),
+        )
+
+    def save(self, path):
+        """ Saves the histogram as a small .npz file (edges, sum_w, sum_w2). """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, edges=self.edges, sum_w=self.sum_w, sum_w2=self.sum_w2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['edges'], data['sum_w'], data['sum_w2'])
+
+
+def histogram_path(histogram_dir, key, index=None):
+    """
+    Path of a saved histogram: the merged histogram of a dataset key,
+    or one chunk of it when index is given.
+    """
+    if index is None:
+        return os.path.join(histogram_dir, f"{key}.npz")
+    return os.path.join(histogram_dir, f"key={key}", f"part-{index:05d}.npz")
+
+
+def merge_histogram_parts(histogram_dir, key):
+    """
+    Adds up the chunk histograms of a dataset key and saves the total as histogram_path(histogram_dir, key).
+    Returns the merged histogram, or None if the key has no chunk histogram.
+    """
+    parts = sorted(glob.glob(os.path.join(histogram_dir, f"key={key}", "part-*.npz")))
+    if not parts:
+        return None
+
+    total = Histogram.load(parts[0])
+    for part in parts[1:]:
+        total += Histogram.load(part)
+    total.save(histogram_path(histogram_dir, key))
+    return total
+
+
+def load_histograms(histogram_dir, keys, weights=None):
+    """
+    Sum of the merged histograms of several dataset keys.
+    With weights ({key: per-event weight}, e.g. datasets.weight_table), each dataset is normalized first.
+    """
+    total = None
+    for key in keys:
+        hist = Histogram.load(histogram_path(histogram_dir, key))
+        if weights is not None:
+            hist = hist.scale(weights[key])
+        total = hist if total is None else total + hist
+    return total
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+def to_cartesian(pt, eta, phi, mass):
+    """
+    Converts (pt, eta, phi, mass) arrays to (px, py, pz, E) float64 arrays.
+    Done once per lepton, so the pair and quad masses only need additions.
+    """
+    pt = np.asarray(pt, dtype=np.float64)
+    eta = np.asarray(eta, dtype=np.float64)
+    phi = np.asarray(phi, dtype=np.float64)
+    mass = np.asarray(mass, dtype=np.float64)
+
+    px = pt * np.cos(phi)
+    py = pt * np.sin(phi)
+    pz = pt * np.sinh(eta)
+    energy = np.sqrt(px**2 + py**2 + pz**2 + mass**2)
+    return px, py, pz, energy
+
+
+def invariant_mass(px, py, pz, energy):
+    """
+    Invariant mass of summed four-vectors. A negative m^2 (rounding, or unphysical inputs)
+    gives a negative mass, the convention of the 'vector' package.
+    """
+    mass_squared = energy**2 - px**2 - py**2 - pz**2
+    return np.copysign(np.sqrt(np.abs(mass_squared)), mass_squared)
+
+
+def combination_mass(p4, *indices):
+    """
+    Invariant mass of combinations of leptons, for many combinations at once.
+    p4 is the (px, py, pz, E) tuple of to_cartesian, and each index array gives,
+    for every combination, the position of one of its leptons in p4.
+    """
+    px, py, pz, energy = p4
+    total = [np.zeros(len(indices[0])) for _ in range(4)]
+    for index in indices:
+        index = np.asarray(index, dtype=np.int64)
+        for component, values in zip(total, (px, py, pz, energy)):
+            component += values[index]
+    return invariant_mass(*total)
+
+
+def pair_mass(pt, eta, phi, mass, i1, i2):
+    """ Invariant mass of the lepton pairs (i1[k], i2[k]). """
+    return combination_mass(to_cartesian(pt, eta, phi, mass), i1, i2)
+
+
+def quad_mass(pt, eta, phi, mass, i1, i2, i3, i4):
+    """ Invariant mass of the four-lepton combinations (i1[k], i2[k], i3[k], i4[k]). """
+    return combination_mass(to_cartesian(pt, eta, phi, mass), i1, i2, i3, i4)
@@ -0,0 +1,133 @@
+import numpy as np
+import awkward as ak
+
+# Compact storage types of the per-lepton columns. NanoAOD stores the kinematics and the isolation
+# in float32; the four-vector sums are done in float64 by kinematics.to_cartesian.
+# 'index' is the position of the lepton in its NanoAOD collection.
+LEPTON_DTYPES = {
+    "pt": np.float32,
+    "eta": np.float32,
+    "phi": np.float32,
+    "mass": np.float32,
+    "iso": np.float32,
+    "charge": np.int8,
+    "flavor": np.uint8,
+    "index": np.int16,
+}
+
+# Per-event identifiers, kept with their NanoAOD types
+EVENT_FIELDS = ["run", "luminosityBlock", "event"]
+
+
+def _offsets_of(jagged):
+    """ Offsets (n_events + 1, int64) of the lists of a jagged awkward array. """
+    counts = ak.to_numpy(ak.num(jagged)).astype(np.int64)
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+class LeptonTable:
+    """
+    Leptons of a batch of events as contiguous NumPy columns (LEPTON_DTYPES, about 24 bytes per lepton),
+    with the per-event identifiers and the offsets of the leptons of each event: the leptons of
+    event i are the rows offsets[i]:offsets[i + 1]. No event id is repeated for every lepton.
+    mask() and select_events() compact the columns in their own buffers, one column at a time.
+    """
+
+    def __init__(self, columns, events, offsets):
+        self.columns = columns
+        self.events = events
+        self.offsets = offsets
+
+    @classmethod
+    def from_arrays(cls, raw_data, collections):
+        """
+        Table of the NanoAOD collections {prefix: PDG flavor} of raw branches (awkward arrays),
+        the leptons of each event in collection order (e.g. muons first, then electrons).
+        """
+        collection_offsets = [_offsets_of(raw_data[f"{prefix}_pt"]) for prefix in collections]
+        offsets = np.sum(collection_offsets, axis=0)
+        n_leptons = int(offsets[-1])
+
+        columns = {name: np.empty(n_leptons, dtype=dtype) for name, dtype in LEPTON_DTYPES.items()}
+        # Rows of the collections already placed in each event
+        filled = offsets[:-1].copy()
+        for (prefix, flavor_pdg), source_offsets in zip(collections.items(), collection_offsets):
+            counts = np.diff(source_offsets)
+            # Destination row of every lepton of this collection
+            local_index = np.arange(source_offsets[-1]) - np.repeat(source_offsets[:-1], counts)
+            rows = np.repeat(filled, counts) + local_index
+            for name, branch in (("pt", "pt"), ("eta", "eta"), ("phi", "phi"), ("mass", "mass"),
+                                 ("iso", "pfRelIso03_all"), ("charge", "charge")):
+                columns[name][rows] = ak.to_numpy(ak.flatten(raw_data[f"{prefix}_{branch}"]))
+            columns["flavor"][rows] = flavor_pdg
+            columns["index"][rows] = local_index
+            filled += counts
+
+        events = {name: ak.to_numpy(raw_data[name]).copy() for name in EVENT_FIELDS if name in raw_data.fields}
+        return cls(columns, events, offsets)
+
+    def __len__(self):
+        """ Number of leptons. """
+        return len(self.columns["pt"])
+
+    @property
+    def n_events(self):
+        return len(self.offsets) - 1
+
+    @property
+    def counts(self):
+        """ Number of leptons of each event. """
+        return np.diff(self.offsets)
+
+    @property
+    def nbytes(self):
+        arrays = list(self.columns.values()) + list(self.events.values()) + [self.offsets]
+        return sum(array.nbytes for array in arrays)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def event_sum(self, values):
+        """ Per-event sum of a per-lepton array (0 for events without leptons). """
+        cumulative = np.zeros(len(values) + 1, dtype=np.result_type(values.dtype, np.int64))
+        np.cumsum(values, out=cumulative[1:])
+        return cumulative[self.offsets[1:]] - cumulative[self.offsets[:-1]]
+
+    def mask(self, keep):
+        """
+        Keeps the leptons where keep is True, in place. The columns are compacted one at a time:
+        values[keep] makes a temporary copy of the kept values of one column, which is written back
+        to the start of the column's buffer, so at most one column is copied at any time.
+        The buffers are not shrunk. Events left without leptons are kept.
+        Returns self.
+        """
+        n_kept = int(np.count_nonzero(keep))
+        for name, values in self.columns.items():
+            values[:n_kept] = values[keep]
+            self.columns[name] = values[:n_kept]
+        # New offsets: the number of kept leptons before the first lepton of each event
+        kept_before = np.zeros(len(keep) + 1, dtype=np.int64)
+        np.cumsum(keep, out=kept_before[1:])
+        self.offsets = kept_before[self.offsets]
+        return self
+
+    def select_events(self, keep_events):
+        """ Keeps the events where keep_events is True, with their leptons, in place. Returns self. """
+        self.mask(np.repeat(keep_events, self.counts))
+        n_kept = int(np.count_nonzero(keep_events))
+        for name, values in self.events.items():
+            values[:n_kept] = values[keep_events]
+            self.events[name] = values[:n_kept]
+        self.offsets = np.concatenate([self.offsets[:1], self.offsets[1:][keep_events]])
+        return self
+
+    def copy(self):
+        return LeptonTable({name: values.copy() for name, values in self.columns.items()},
+                           {name: values.copy() for name, values in self.events.items()},
+                           self.offsets.copy())
+
+    def to_awkward(self):
+        """ Jagged awkward array of the leptons (one list per event), sharing the column buffers. """
+        return ak.unflatten(ak.zip(self.columns), self.counts)
@@ -0,0 +1,144 @@
+import os
+import glob
+import json
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from . import config
+from .datasets import LUMINOSITY_PB
+
+# Certified luminosity sections of the collision data. A CMS golden JSON lists, for each run,
+# the certified [first, last] luminosity block ranges: {"190645": [[10, 110]], "190646": [[1, 111]]}.
+# (run, luminosityBlock) pairs are packed in one int64 key, so a lookup is a single np.searchsorted.
+
+
+def lumi_keys(run, luminosity_block):
+    """ int64 keys of (run, luminosityBlock) pairs, in the order of the runs then of the blocks. """
+    return (np.asarray(run, dtype=np.int64) << 32) | np.asarray(luminosity_block, dtype=np.int64)
+
+
+class LumiMask:
+    """
+    Sorted, non-overlapping [start, stop] intervals of certified lumi_keys.
+    contains() tests any number of events with one binary search, without a per-event membership test.
+    """
+
+    def __init__(self, starts, stops):
+        self.starts = starts
+        self.stops = stops
+
+    @classmethod
+    def from_ranges(cls, ranges):
+        """ Mask of a {run: [[first, last], ...]} dictionary (the golden JSON content). """
+        pairs = [(int(run), first, last) for run, blocks in ranges.items() for first, last in blocks]
+        if not pairs:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+        runs, firsts, lasts = np.array(pairs, dtype=np.int64).T
+        starts = lumi_keys(runs, firsts)
+        stops = lumi_keys(runs, lasts)
+        order = np.argsort(starts, kind="stable")
+        starts, stops = starts[order], stops[order]
+
+        # Overlapping or adjacent ranges are merged, so that each key falls in at most one interval
+        stops = np.maximum.accumulate(stops)
+        new_interval = np.ones(len(starts), dtype=bool)
+        new_interval[1:] = starts[1:] > stops[:-1] + 1
+        first_of_interval = np.flatnonzero(new_interval)
+        last_of_interval = np.append(first_of_interval[1:], len(starts)) - 1
+        return cls(starts[first_of_interval], stops[last_of_interval])
+
+    @classmethod
+    def load(cls, path):
+        """ Mask of a CMS golden JSON file. """
+        with open(path) as f:
+            return cls.from_ranges(json.load(f))
+
+    @property
+    def n_lumi_sections(self):
+        return int(np.sum(self.stops - self.starts + 1))
+
+    def contains(self, run, luminosity_block):
+        """ Boolean array: True for the (run, luminosityBlock) pairs of a certified luminosity section. """
+        keys = lumi_keys(run, luminosity_block)
+        interval = np.searchsorted(self.starts, keys, side="right") - 1
+        inside = interval >= 0
+        inside[inside] = keys[inside] <= self.stops[interval[inside]]
+        return inside
+
+
+@lru_cache(maxsize=4)
+def load_lumi_mask(path):
+    """ LumiMask of a golden JSON, read once per process (workers process many chunks). """
+    return LumiMask.load(path)
+
+
+def read_lumi_table(path):
+    """
+    Recorded luminosity of each luminosity section, from a 'brilcalc lumi --byls -o <file>.csv' table
+    ('run:fill', 'ls:ls', ..., 'recorded(/ub)' columns). Returns (sorted lumi_keys, recorded luminosity in pb^-1).
+    """
+    table = pd.read_csv(path, comment="#", header=None, usecols=[0, 1, 6], names=["run", "ls", "recorded"],
+                        dtype=str)
+    runs = table["run"].str.split(":").str[0].astype(np.int64)
+    blocks = table["ls"].str.split(":").str[0].astype(np.int64)
+    keys = lumi_keys(runs.to_numpy(), blocks.to_numpy())
+    # brilcalc gives the luminosity in ub^-1
+    recorded_pb = table["recorded"].astype(np.float64).to_numpy() * 1e-6
+    order = np.argsort(keys, kind="stable")
+    return keys[order], recorded_pb[order]
+
+
+def integrated_luminosity(keys, lumi_table):
+    """ Recorded luminosity (pb^-1) of a set of unique lumi_keys; sections missing from the table count 0. """
+    table_keys, recorded_pb = lumi_table
+    if len(table_keys) == 0:
+        return 0.0
+    position = np.minimum(np.searchsorted(table_keys, keys), len(table_keys) - 1)
+    found = table_keys[position] == keys
+    return float(np.sum(recorded_pb[position[found]]))
+
+
+def lumi_sections_path(lumi_dir, key, index):
+    """ Path of the certified luminosity sections seen by one chunk of a dataset key. """
+    return os.path.join(lumi_dir, f"key={key}", f"part-{index:05d}.npy")
+
+
+def processed_lumi_sections(lumi_dir, key):
+    """ Sorted unique lumi_keys of the certified luminosity sections seen by all the chunks of a dataset key. """
+    parts = sorted(glob.glob(os.path.join(lumi_dir, f"key={key}", "part-*.npy")))
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate([np.load(part) for part in parts]))
+
+
+def luminosity_report(lumi_dir, keys, lumi_table_path=None):
+    """
+    {key: {'lumi_sections', 'luminosity_pb'}} of the processed data keys, and 'total' for their union
+    (DoubleMuon and DoubleElectron record the same luminosity sections, which are counted once).
+    'luminosity_pb' is None without a brilcalc table.
+    """
+    lumi_table = read_lumi_table(lumi_table_path) if lumi_table_path else None
+    sections = {key: processed_lumi_sections(lumi_dir, key) for key in keys}
+    sections["total"] = np.unique(np.concatenate([np.empty(0, dtype=np.int64), *sections.values()]))
+    return {
+        key: {
+            'lumi_sections': len(key_sections),
+            'luminosity_pb': None if lumi_table is None else integrated_luminosity(key_sections, lumi_table),
+        }
+        for key, key_sections in sections.items()
+    }
+
+
+def analysis_luminosity_pb():
+    """
+    Luminosity (pb^-1) the MC samples are normalized to: the integrated luminosity of the certified
+    sections processed by the run of the output directory (config.LUMI_REPORT_PATH) when it is known,
+    otherwise datasets.LUMINOSITY_PB.
+    """
+    if not os.path.exists(config.LUMI_REPORT_PATH):
+        return LUMINOSITY_PB
+    with open(config.LUMI_REPORT_PATH) as f:
+        luminosity_pb = json.load(f)["total"]["luminosity_pb"]
+    return LUMINOSITY_PB if luminosity_pb is None else luminosity_pb
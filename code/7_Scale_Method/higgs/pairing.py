@@ -0,0 +1,224 @@
+import numpy as np
+import pandas as pd
+import awkward as ak
+
+from .kinematics import to_cartesian, combination_mass
+
+Z_MASS = 91.1876
+
+# Mass windows (GeV, exclusive) of the Z1 and Z2 of a ZZ candidate built by build_zz_candidates
+Z1_WINDOW = (40.0, 120.0)
+Z2_WINDOW = (12.0, 120.0)
+
+# Only the MAX_LEPTONS leptons of highest pT of an event are combined, which bounds the number
+# of ZZ candidates of an event (at most 3 * C(8, 4) = 210 for 8 leptons)
+MAX_LEPTONS = 8
+
+
+def build_lepton_events(df):
+    """
+    Rebuilds the event structure of a flattened lepton DataFrame as a jagged awkward array.
+    Leptons keep their original order inside each event, so combinations are formed
+    in the same order as itertools.combinations over the DataFrame index.
+    Returns (event_ids, leptons) where leptons[i] holds the leptons of event_ids[i].
+    """
+    # A stable sort keeps the original lepton order inside each event
+    df_sorted = df.sort_values('event_id', kind='stable')
+    event_ids, counts = np.unique(df_sorted['event_id'].to_numpy(), return_counts=True)
+
+    flat = ak.zip({
+        "pt": df_sorted['pt'].to_numpy(dtype=np.float64),
+        "eta": df_sorted['eta'].to_numpy(dtype=np.float64),
+        "phi": df_sorted['phi'].to_numpy(dtype=np.float64),
+        "mass": df_sorted['mass'].to_numpy(dtype=np.float64),
+        "charge": df_sorted['charge'].to_numpy(),
+        "flavor": df_sorted['flavor'].to_numpy(),
+        "index": df_sorted.index.to_numpy(),
+    })
+    return event_ids, ak.unflatten(flat, counts)
+
+
+def pair_z_candidates(leptons, z_mass=Z_MASS):
+    """
+    Columnar Z1/Z2 pairing on a jagged array of leptons (one list per event).
+    Applies the same rules as find_z_candidates, but for all events at once:
+    SFOS pairs, Z1 closest to z_mass, Z2 the best pair disjoint from Z1, and M4l.
+    Returns a dictionary of per-event arrays and a boolean 'selected' mask.
+    """
+    n_events = len(leptons)
+
+    # Four-vectors of all the leptons, as flat arrays; combinations refer to them by flat position
+    counts = ak.to_numpy(ak.num(leptons))
+    starts = np.cumsum(counts) - counts
+    p4 = to_cartesian(*(ak.to_numpy(ak.flatten(leptons[field])) for field in ("pt", "eta", "phi", "mass")))
+
+    def _flat_index(local_index, event_starts):
+        return ak.to_numpy(ak.flatten(local_index + event_starts))
+
+    # 1. All two-lepton combinations per event (same order as itertools.combinations)
+    pairs = ak.argcombinations(leptons, 2, fields=["i", "j"])
+    l1 = leptons[pairs.i]
+    l2 = leptons[pairs.j]
+
+    # SFOS Condition (Same Flavor, Opposite Sign) and finite pair mass
+    flat_pair_mass = combination_mass(p4, _flat_index(pairs.i, starts), _flat_index(pairs.j, starts))
+    pair_mass = ak.unflatten(flat_pair_mass, ak.num(pairs))
+    sfos = (l1.flavor == l2.flavor) & (l1.charge * l2.charge < 0) & np.isfinite(pair_mass)
+
+    pairs = pairs[sfos]
+    pair_mass = pair_mass[sfos]
+    abs_diff_z = np.abs(pair_mass - z_mass)
+
+    # 2. Z1 is the SFOS pair closest to M_Z (argmin keeps the first pair on ties, like a stable sort)
+    has_two_pairs = ak.num(pairs) >= 2
+    z1_pos = ak.argmin(abs_diff_z, axis=1, keepdims=True)
+    z1 = ak.firsts(pairs[z1_pos])
+    z1_mass = ak.firsts(pair_mass[z1_pos])
+
+    # 3. Z2 is the SFOS pair closest to M_Z that does not share a lepton with Z1
+    disjoint = (
+        (pairs.i != z1.i) & (pairs.i != z1.j) &
+        (pairs.j != z1.i) & (pairs.j != z1.j)
+    )
+    disjoint = ak.fill_none(disjoint, False)
+    z2_pos = ak.argmin(abs_diff_z[disjoint], axis=1, keepdims=True)
+    z2 = ak.firsts(pairs[disjoint][z2_pos])
+    z2_mass = ak.firsts(pair_mass[disjoint][z2_pos])
+
+    # 4. Higgs mass (M4l) from the four selected leptons
+    selected = has_two_pairs & ~ak.is_none(z2)
+    selected = ak.to_numpy(ak.fill_none(selected, False))
+
+    selected_starts = starts[selected]
+    h_mass = np.full(n_events, np.nan)
+    h_mass[selected] = combination_mass(p4, *(
+        ak.to_numpy(local_index[selected]) + selected_starts
+        for local_index in (z1.i, z1.j, z2.i, z2.j)
+    ))
+
+    # Events where the four-lepton mass is not finite are dropped, as in the loop version
+    selected = selected & np.isfinite(h_mass)
+
+    def _local_index(values):
+        return ak.to_numpy(ak.fill_none(values, -1)).astype(np.int64)
+
+    return {
+        'selected': selected,
+        'z1_mass': ak.to_numpy(ak.fill_none(z1_mass, np.nan)),
+        'z2_mass': ak.to_numpy(ak.fill_none(z2_mass, np.nan)),
+        'mass': h_mass,
+        'l_indices': np.stack([
+            _local_index(z1.i), _local_index(z1.j),
+            _local_index(z2.i), _local_index(z2.j)
+        ], axis=1),
+    }
+
+
+def build_zz_candidates(leptons, z_mass=Z_MASS, z1_window=Z1_WINDOW, z2_window=Z2_WINDOW,
+                        max_leptons=MAX_LEPTONS):
+    """
+    Columnar ZZ candidate builder for events with four or more leptons (one list per event).
+    Every pair of disjoint SFOS pairs of an event is a candidate; its Z1 is the pair closest
+    to z_mass. Candidates with Z1 or Z2 outside their mass window are dropped, and the best one
+    is kept: Z1 closest to z_mass, then the Z2 of highest scalar pT sum.
+    All the events are processed at once, without a Python loop over events or combinations.
+    Returns the same dictionary as pair_z_candidates (l_indices are positions in each event's list).
+    """
+    n_events = len(leptons)
+
+    # Bounded combinatorics: the max_leptons leptons of highest pT, in their original order
+    kept = ak.sort(ak.argsort(leptons.pt, axis=1, ascending=False)[:, :max_leptons], axis=1)
+    leptons = leptons[kept]
+
+    counts = ak.to_numpy(ak.num(leptons))
+    starts = np.cumsum(counts) - counts
+    p4 = to_cartesian(*(ak.to_numpy(ak.flatten(leptons[field])) for field in ("pt", "eta", "phi", "mass")))
+
+    def _flat_index(local_index):
+        return ak.to_numpy(ak.flatten(local_index + starts))
+
+    # 1. SFOS pairs, with their mass and the scalar pT sum of their leptons
+    pairs = ak.argcombinations(leptons, 2, fields=["i", "j"])
+    l1 = leptons[pairs.i]
+    l2 = leptons[pairs.j]
+    pair_mass = ak.unflatten(combination_mass(p4, _flat_index(pairs.i), _flat_index(pairs.j)), ak.num(pairs))
+    sfos = (l1.flavor == l2.flavor) & (l1.charge * l2.charge < 0) & np.isfinite(pair_mass)
+    pairs = pairs[sfos]
+    pair_mass = pair_mass[sfos]
+    pair_pt = (l1.pt + l2.pt)[sfos]
+    abs_diff_z = np.abs(pair_mass - z_mass)
+
+    # 2. ZZ candidates: two SFOS pairs without a shared lepton, Z1 the one closest to z_mass
+    zz = ak.argcombinations(pairs, 2, fields=["a", "b"])
+    pair_a = pairs[zz.a]
+    pair_b = pairs[zz.b]
+    disjoint = (
+        (pair_a.i != pair_b.i) & (pair_a.i != pair_b.j) &
+        (pair_a.j != pair_b.i) & (pair_a.j != pair_b.j)
+    )
+    zz = zz[disjoint]
+    a_is_z1 = abs_diff_z[zz.a] <= abs_diff_z[zz.b]
+    z1_pair = ak.where(a_is_z1, zz.a, zz.b)
+    z2_pair = ak.where(a_is_z1, zz.b, zz.a)
+
+    # 3. Mass windows of Z1 and Z2
+    z1_mass = pair_mass[z1_pair]
+    z2_mass = pair_mass[z2_pair]
+    in_windows = (
+        (z1_mass > z1_window[0]) & (z1_mass < z1_window[1]) &
+        (z2_mass > z2_window[0]) & (z2_mass < z2_window[1])
+    )
+    z1_pair = z1_pair[in_windows]
+    z2_pair = z2_pair[in_windows]
+
+    # 4. Best candidate: Z1 closest to z_mass, then the highest scalar pT sum of the Z2 leptons
+    z1_diff = abs_diff_z[z1_pair]
+    best_z1 = z1_diff == ak.min(z1_diff, axis=1, keepdims=True, mask_identity=False)
+    z2_score = ak.where(best_z1, pair_pt[z2_pair], -np.inf)
+    best = ak.argmax(z2_score, axis=1, keepdims=True)
+    z1 = ak.firsts(pairs[z1_pair[best]])
+    z2 = ak.firsts(pairs[z2_pair[best]])
+
+    selected = ak.to_numpy(~ak.is_none(z2))
+    local_indices = [z1.i, z1.j, z2.i, z2.j]
+    h_mass = np.full(n_events, np.nan)
+    h_mass[selected] = combination_mass(p4, *(
+        ak.to_numpy(local_index[selected]) + starts[selected] for local_index in local_indices
+    ))
+    # Candidates whose four-lepton mass is not finite are dropped, as in pair_z_candidates
+    selected = selected & np.isfinite(h_mass)
+
+    # Positions in the original lists of the events (before keeping the max_leptons leading ones)
+    original_indices = [
+        ak.to_numpy(ak.fill_none(ak.firsts(kept[ak.singletons(local_index)]), -1)).astype(np.int64)
+        for local_index in local_indices
+    ]
+    return {
+        'selected': selected,
+        'z1_mass': ak.to_numpy(ak.fill_none(ak.firsts(pair_mass[z1_pair[best]]), np.nan)),
+        'z2_mass': ak.to_numpy(ak.fill_none(ak.firsts(pair_mass[z2_pair[best]]), np.nan)),
+        'mass': h_mass,
+        'l_indices': np.stack(original_indices, axis=1),
+    }
+
+
+def find_z_candidates_columnar(df):
+    """
+    Drop-in replacement for find_z_candidates built on awkward arrays.
+    Returns the same ['event_id', 'mass'] DataFrame, one row per selected event.
+    """
+    df_lite = df.drop(columns=['lv']) if 'lv' in df.columns else df
+    if df_lite.empty:
+        return pd.DataFrame(columns=['event_id', 'mass'])
+
+    event_ids, leptons = build_lepton_events(df_lite)
+    result = pair_z_candidates(leptons)
+    selected = result['selected']
+
+    z_df = pd.DataFrame({
+        'event_id': event_ids[selected],
+        'mass': result['mass'][selected],
+    })
+
+    print(f"\nTotal events with at least two SFOS pairs (Z1+Z2) : {len(z_df)}")
+    return z_df
@@ -0,0 +1,435 @@
+import os
+import glob
+import json
+import shutil
+from functools import partial
+
+import numpy as np
+import awkward as ak
+import uproot
+
+from . import config
+from .event_selection import (iterate_events, skim_events, select_higgs_candidates, lepton_branches,
+                              QUALITY_CUTS, SKIM_MIN_LEPTONS)
+from .skim_cache import SkimCache
+from .histogram import Histogram, histogram_path, merge_histogram_parts
+from .profiler import StageProfiler, profile_stage, profile_batches
+from .prefetch import get_decompression_executor, prefetch, branch_timings, print_branch_timings
+from .scheduler import build_work_units, run_work_units, get_events_tree, init_worker
+from .executors import make_executor, call_with_config
+from .candidate_store import write_candidates, partition_path
+from .checkpoint import RunManifest, check_coverage, verify_inputs
+from .checksums import adler32_of_file
+from .pairing import Z_MASS, Z1_WINDOW, Z2_WINDOW, MAX_LEPTONS
+from .datasets import mc_files, weight_table
+from .variations import NOMINAL, loosest_cuts, apply_variation, scan_variations
+from .lumi_mask import load_lumi_mask, lumi_keys, lumi_sections_path, luminosity_report
+
+# The settings are read from the config module when a function runs (config.NAME), not copied
+# at import, so that the command line options and the scripts can change them before a run.
+
+
+def systematic_variations():
+    """ Variations of the config.SYSTEMATIC_SCANS, in scan order. """
+    return [
+        variation for parameter, values in config.SYSTEMATIC_SCANS.items()
+        for variation in scan_variations(parameter, values)
+    ]
+
+
+def selection_settings(key):
+    """
+    Settings the outputs of a dataset key depend on. The checkpoint manifest records them with the input
+    file of the key, and a key whose settings changed is processed again (RunManifest.update_inputs).
+    """
+    settings = {
+        'pipeline_mode': config.PIPELINE_MODE,
+        'max_events': config.MAX_EVENTS,
+        'quality_cuts': QUALITY_CUTS,
+        'skim_min_leptons': SKIM_MIN_LEPTONS,
+        'z_mass': Z_MASS,
+        'z1_window': Z1_WINDOW,
+        'z2_window': Z2_WINDOW,
+        'max_leptons': MAX_LEPTONS,
+        'systematic_scans': config.SYSTEMATIC_SCANS,
+        'm4l_binning': config.M4L_BINNING,
+    }
+    if key in config.DATA_FILES:
+        # Only the collision data is masked. The golden JSON is recorded by content: chunks selected with
+        # another mask keep other events and saw other certified sections, so the key is processed again.
+        settings['lumi_mask_adler32'] = None if config.LUMI_MASK is None else adler32_of_file(config.LUMI_MASK)
+    return settings
+
+
+def load_skim(unit, tree, profiler=None, cuts=QUALITY_CUTS):
+    """
+    Returns the skimmed events (after quality cuts and cleaning) of one work unit.
+    The skim is taken from the cache when available; otherwise the unit is streamed
+    in STEP_SIZE batches, skimmed, and stored in the cache.
+    """
+    if config.USE_SKIM_CACHE:
+        skim_cache = SkimCache(config.SKIM_CACHE_DIR, config.SKIM_CACHE_MAX_BYTES)
+        skim_key = skim_cache.skim_key(unit.file_path, unit.entry_start, unit.entry_stop,
+                                       lepton_branches(), dict(cuts, min_leptons=SKIM_MIN_LEPTONS))
+        with profile_stage(profiler, "load_skim_cache") as record:
+            skim = skim_cache.get(skim_key)
+            if skim is None:
+                record.discard = True
+            else:
+                record.events = unit.entry_stop - unit.entry_start
+                record.rows_out = len(skim)
+        if skim is not None:
+            return skim
+
+    # The chunk is read in batches bounded by STEP_SIZE; only the small skims are kept
+    batches = iterate_events(unit.file_path, config.STEP_SIZE, unit.entry_start, unit.entry_stop, tree=tree,
+                             decompression_executor=get_decompression_executor(config.DECOMPRESSION_THREADS))
+    if config.PREFETCH:
+        batches = prefetch(batches)
+    batches = profile_batches(batches, profiler, "load")
+    skim = ak.concatenate([skim_events(events, cuts, profiler=profiler) for _, _, events in batches])
+
+    if config.USE_SKIM_CACHE:
+        skim_cache.put(skim_key, skim)
+    return skim
+
+
+def chunk_lumi_mask(unit):
+    """ LumiMask of config.LUMI_MASK for a collision data chunk; None for the MC samples or without LUMI_MASK. """
+    if config.LUMI_MASK is None or unit.key not in config.DATA_FILES:
+        return None
+    return load_lumi_mask(config.LUMI_MASK)
+
+
+def certified_lumi_sections(unit, tree, lumi_mask, profiler=None):
+    """
+    Sorted lumi_keys of the certified luminosity sections of a chunk, for the luminosity report.
+    Read from the run and luminosityBlock branches of all its events: the skims only keep 4-lepton events.
+    """
+    with profile_stage(profiler, "lumi_sections") as record:
+        ids = tree.arrays(["run", "luminosityBlock"], entry_start=unit.entry_start, entry_stop=unit.entry_stop,
+                          library="np")
+        # One lookup per luminosity section, not per event
+        sections = np.unique(lumi_keys(ids["run"], ids["luminosityBlock"]))
+        sections = sections[lumi_mask.contains(sections >> 32, sections & 0xFFFFFFFF)]
+        record.rows_in = len(ids["run"])
+        record.rows_out = len(sections)
+    return sections
+
+
+def select_certified(events, lumi_mask, profiler=None):
+    """ Keeps the skimmed events of a certified luminosity section (one vectorized lookup). """
+    with profile_stage(profiler, "lumi_mask") as record:
+        record.rows_in = len(events)
+        events = events[lumi_mask.contains(ak.to_numpy(events.run), ak.to_numpy(events.luminosityBlock))]
+        record.rows_out = len(events)
+    return events
+
+
+def chunk_output(z_boson_df, candidates_dir, histogram_dir):
+    """ (candidates_dir, histogram_dir, candidates, M4l histogram) of one selection of a chunk. """
+    m4l_hist = Histogram.regular(*config.M4L_BINNING)
+    if not z_boson_df.empty:
+        m4l_hist.fill(z_boson_df['mass'])
+    return candidates_dir, histogram_dir, z_boson_df, m4l_hist
+
+
+def write_chunk_outputs(unit, outputs):
+    """ Writes the chunk_output()s of one chunk. Returns the candidate file path of the first (nominal) one. """
+    paths = []
+    for candidates_dir, histogram_dir, z_boson_df, m4l_hist in outputs:
+        paths.append(write_candidates(z_boson_df, candidates_dir, unit.key, unit.index))
+        m4l_hist.save(histogram_path(histogram_dir, unit.key, unit.index))
+    return paths[0]
+
+
+def process_chunk(unit):
+    """
+    Runs the full selection on one work unit (file, entry range).
+    Called by the executor, possibly in a worker process or on another node.
+    With SYSTEMATIC_SCANS, the chunk is read and skimmed once with the loosest cuts,
+    and every variation is selected from that skim.
+    The candidates and histograms are returned in 'outputs' (nominal first), to be written by the
+    driver process, with the stage profile of the chunk.
+    """
+    profiler = StageProfiler()
+    tree = get_events_tree(unit.file_path)
+    n_events = unit.entry_stop - unit.entry_start
+    variations = systematic_variations()
+    outputs = []
+    lumi_mask = chunk_lumi_mask(unit)
+    lumi_sections = None if lumi_mask is None else certified_lumi_sections(unit, tree, lumi_mask, profiler)
+
+    if config.PIPELINE_MODE == "events" and variations:
+        skim = load_skim(unit, tree, profiler, cuts=loosest_cuts([NOMINAL] + variations))
+        # The skim cache holds every event; the mask is applied to the skim, so it can change between runs
+        if lumi_mask is not None:
+            skim = select_certified(skim, lumi_mask, profiler)
+        z_boson_df = select_higgs_candidates(apply_variation(skim, NOMINAL), profiler=profiler)
+        outputs.append(chunk_output(z_boson_df, config.CANDIDATES_DIR, config.HISTOGRAM_DIR))
+        for variation in variations:
+            with profile_stage(profiler, "apply_variation") as record:
+                record.rows_in = len(skim)
+                varied_skim = apply_variation(skim, variation)
+                record.rows_out = len(varied_skim)
+            z_variation_df = select_higgs_candidates(varied_skim, profiler=profiler, z_mass=variation.z_mass)
+            outputs.append(chunk_output(z_variation_df, config.VARIATIONS_DIR + f"{variation.name}/candidates/",
+                                        config.VARIATIONS_DIR + f"{variation.name}/histograms/"))
+    elif config.PIPELINE_MODE == "events":
+        skim = load_skim(unit, tree, profiler)
+        if lumi_mask is not None:
+            skim = select_certified(skim, lumi_mask, profiler)
+        z_boson_df = select_higgs_candidates(skim, profiler=profiler)
+        outputs.append(chunk_output(z_boson_df, config.CANDIDATES_DIR, config.HISTOGRAM_DIR))
+    else:
+        # The flat implementation (and its reference loop version) is only loaded in the "flat" mode
+        from .flat_selection import load_data_from_file, get_higgs_candidates
+
+        with profile_stage(profiler, "load") as record:
+            leptons = load_data_from_file(unit.file_path, unit.key, unit.entry_start, unit.entry_stop, tree=tree)
+            record.events = n_events
+            record.rows_in = n_events
+            record.rows_out = 0 if leptons is None else len(leptons)
+        if lumi_mask is not None and leptons is not None:
+            with profile_stage(profiler, "lumi_mask") as record:
+                record.rows_in = leptons.n_events
+                leptons.select_events(lumi_mask.contains(leptons.events["run"], leptons.events["luminosityBlock"]))
+                record.rows_out = leptons.n_events
+        z_boson_df = get_higgs_candidates(leptons, profiler)
+        outputs.append(chunk_output(z_boson_df, config.CANDIDATES_DIR, config.HISTOGRAM_DIR))
+
+    # Every stage of this chunk worked on its n_events input events (used for the events/s rate)
+    for stats in profiler.stages.values():
+        stats['events'] = n_events
+    result = {'n_events': n_events, 'n_candidates': len(z_boson_df), 'outputs': outputs, 'profile': profiler.stages}
+    if lumi_sections is not None:
+        result['lumi_sections'] = lumi_sections
+    return result
+
+
+def run_units(work_units, process_unit=process_chunk, on_result=None, profiler=None):
+    """
+    Runs process_unit on the work units with the config.EXECUTOR backend and the config of this process.
+    The 'outputs' sent back by the workers are written here (stage "write" of profiler) and replaced
+    by the nominal candidate file path in 'output', before on_result(unit, result) is called.
+    The certified 'lumi_sections' of data chunks are saved in config.LUMI_DIR.
+    Returns the (unit, result) list of run_work_units.
+    """
+    def write_outputs(unit, result):
+        if 'outputs' in result:
+            with profile_stage(profiler, "write") as record:
+                record.events = result['n_events']
+                record.rows_in = record.rows_out = sum(len(output[2]) for output in result['outputs'])
+                result['output'] = write_chunk_outputs(unit, result.pop('outputs'))
+        if 'lumi_sections' in result:
+            path = lumi_sections_path(config.LUMI_DIR, unit.key, unit.index)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            np.save(path, result.pop('lumi_sections'))
+        if on_result is not None:
+            on_result(unit, result)
+
+    if config.EXECUTOR == "processes" and config.N_WORKERS <= 1:
+        return run_work_units(work_units, process_unit, on_result=write_outputs)
+
+    executor = make_executor(initializer=init_worker)
+    try:
+        return run_work_units(work_units, partial(call_with_config, config.snapshot(), process_unit),
+                              on_result=write_outputs, executor=executor)
+    finally:
+        executor.close()
+
+
+def with_mc():
+    """ True when the MC samples are processed with the data (PROCESS_MC, only in the "events" mode). """
+    return config.PROCESS_MC and config.PIPELINE_MODE == "events"
+
+
+def input_files():
+    """ {key: path} of the files processed by a run: the data files, and the MC samples with with_mc(). """
+    if with_mc():
+        return {**config.DATA_FILES, **mc_files()}
+    return dict(config.DATA_FILES)
+
+
+def remove_outputs(key):
+    """
+    Removes every output of a dataset key (candidates, histograms, variations, certified luminosity sections)
+    before its changed input file is processed again: the new file may have fewer chunks than the old one.
+    """
+    directories = [partition_path(config.CANDIDATES_DIR, key), os.path.join(config.HISTOGRAM_DIR, f"key={key}"),
+                   os.path.join(config.LUMI_DIR, f"key={key}")]
+    directories += glob.glob(os.path.join(config.VARIATIONS_DIR, "*", "*", f"key={key}"))
+    for directory in directories:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    merged = [histogram_path(config.HISTOGRAM_DIR, key)]
+    merged += glob.glob(os.path.join(config.VARIATIONS_DIR, "*", "histograms", f"{key}.npz"))
+    for path in merged:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def report_luminosity():
+    """
+    Prints the certified luminosity sections processed for every data key (including the chunks of
+    earlier runs skipped by the checkpoint) with their integrated luminosity, and writes the report
+    to config.LUMI_REPORT_PATH, where the MC normalization reads it (lumi_mask.analysis_luminosity_pb).
+    """
+    report = luminosity_report(config.LUMI_DIR, config.DATA_FILES.keys(), config.LUMI_TABLE)
+    print("\n--- Certified luminosity processed ---")
+    for key, entry in report.items():
+        luminosity = ("unknown (no LUMI_TABLE)" if entry['luminosity_pb'] is None
+                      else f"{entry['luminosity_pb']:.1f} pb^-1")
+        print(f"{key}: {entry['lumi_sections']} luminosity sections, {luminosity}")
+
+    tmp_path = config.LUMI_REPORT_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=1)
+    os.replace(tmp_path, config.LUMI_REPORT_PATH)
+    return report
+
+
+def run():
+    """
+    Runs the analysis on the input_files() with the current config, on N_WORKERS processes:
+    candidates and histograms of every chunk, merged histograms per dataset key, stage profile.
+    Returns the (unit, result) list of the chunks processed by this run.
+    """
+    print("--- START OF H -> 4l ANALYSIS (Real Data) ---")
+
+    variations = systematic_variations()
+    if variations and config.PIPELINE_MODE != "events":
+        raise ValueError('SYSTEMATIC_SCANS need PIPELINE_MODE = "events".')
+
+    files = input_files()
+    if config.CHECKSUM_MANIFEST is not None:
+        verify_inputs([path for path in files.values() if os.path.exists(path)], config.CHECKSUM_MANIFEST,
+                      config.CHECKSUM_THREADS)
+
+    work_units = build_work_units(files, config.MAX_EVENTS)
+    # Every entry of every file must belong to exactly one chunk
+    check_coverage(work_units)
+
+    if config.REPORT_BRANCH_TIMINGS:
+        for unit in work_units:
+            if unit.index == 0:
+                print(f"\nBranch timings for {unit.key}, entries {unit.entry_start}-{unit.entry_stop}:")
+                with uproot.open(unit.file_path) as file:
+                    print_branch_timings(branch_timings(file["Events"], lepton_branches(),
+                                                        unit.entry_start, unit.entry_stop))
+
+    if config.LUMI_MASK is not None:
+        lumi_mask = load_lumi_mask(config.LUMI_MASK)
+        print(f"Lumi mask {config.LUMI_MASK}: {lumi_mask.n_lumi_sections} certified luminosity sections.")
+
+    checksum = adler32_of_file
+    if config.USE_SKIM_CACHE:
+        # Checksum the inputs once here, rather than in every worker
+        skim_cache = SkimCache(config.SKIM_CACHE_DIR, config.SKIM_CACHE_MAX_BYTES)
+        for file_path in sorted({unit.file_path for unit in work_units}):
+            print(f"Input {file_path}: adler32 {skim_cache.file_checksum(file_path)}")
+        # The checkpoint compares the same checksums, without reading the files again
+        checksum = skim_cache.file_checksum
+
+    if with_mc():
+        # Reads the generated-event counts once (they are cached), before the workers start
+        for key, weight in weight_table(config.DATA_FILES).items():
+            if key not in config.DATA_FILES:
+                print(f"MC sample {key}: weight {weight:.3e} per event")
+
+    on_result = None
+    if config.CHECKPOINT:
+        manifest = RunManifest(config.MANIFEST_PATH)
+        # Incremental run: only the new inputs, and the ones whose content or selection settings changed,
+        # are processed
+        selection = {key: selection_settings(key) for key in files}
+        for key in manifest.update_inputs(files, checksum, selection):
+            print(f"Input {key} or its selection settings changed since the last run: "
+                  f"its outputs are removed and it is processed again.")
+            remove_outputs(key)
+        manifest.save()
+        manifest.check_compatible(work_units)
+        n_units = len(work_units)
+        work_units = [unit for unit in work_units if not manifest.is_done(unit)]
+        print(f"Checkpoint: {n_units - len(work_units)} chunk(s) already processed, {len(work_units)} remaining.")
+
+        def on_result(unit, result):
+            manifest.record(unit, result['output'], result['n_candidates'])
+
+    print(f"{len(work_units)} chunks of at most {config.MAX_EVENTS} events, on {config.N_WORKERS} worker(s) "
+          f"({config.EXECUTOR}).")
+
+    write_profile = StageProfiler()
+    results = run_units(work_units, on_result=on_result, profiler=write_profile)
+
+    n_candidates = sum(result['n_candidates'] for _, result in results)
+    print(f"\nHiggs candidates written in this run: {n_candidates}")
+    if config.CHECKPOINT:
+        n_total = sum(entry['n_candidates'] for entry in manifest.units.values())
+        print(f"Higgs candidates of all the runs ({len(manifest.units)} chunks): {n_total}")
+
+    # Chunk histograms of all runs (including the chunks skipped by the checkpoint) are added up per dataset.
+    # Only the datasets processed by this run change: the other merged histograms are kept as they are.
+    processed_keys = {unit.key for unit, _ in results}
+    for key in files:
+        if key in processed_keys or not os.path.exists(histogram_path(config.HISTOGRAM_DIR, key)):
+            merge_histogram_parts(config.HISTOGRAM_DIR, key)
+        for variation in variations:
+            variation_dir = config.VARIATIONS_DIR + f"{variation.name}/histograms/"
+            if key in processed_keys or not os.path.exists(histogram_path(variation_dir, key)):
+                merge_histogram_parts(variation_dir, key)
+
+    if config.LUMI_MASK is not None:
+        report_luminosity()
+    elif os.path.exists(config.LUMI_REPORT_PATH):
+        # The report of an earlier masked run no longer describes the candidates
+        os.remove(config.LUMI_REPORT_PATH)
+
+    run_profile = StageProfiler()
+    for _, result in results:
+        run_profile.merge(result['profile'])
+    run_profile.merge(write_profile.stages)
+    run_profile.print_summary()
+    run_profile.write_json(config.PROFILE_PATH)
+    return results
+
+
+def skim_chunk(unit):
+    """ Fills the skim cache with one work unit. Called by the executor, possibly in a worker process. """
+    profiler = StageProfiler()
+    n_events = unit.entry_stop - unit.entry_start
+    skim = load_skim(unit, get_events_tree(unit.file_path), profiler,
+                     cuts=loosest_cuts([NOMINAL] + systematic_variations()))
+    for stats in profiler.stages.values():
+        stats['events'] = n_events
+    return {'n_events': n_events, 'n_skimmed': len(skim), 'profile': profiler.stages}
+
+
+def skim():
+    """
+    Reads every input_files() chunk once and stores its skim in the skim cache, so that
+    the following runs (other cuts of the systematic scans, other settings) start from the skims.
+    """
+    if config.PIPELINE_MODE != "events" or not config.USE_SKIM_CACHE:
+        raise ValueError('Skimming needs PIPELINE_MODE = "events" and USE_SKIM_CACHE = True.')
+
+    files = input_files()
+    if config.CHECKSUM_MANIFEST is not None:
+        verify_inputs([path for path in files.values() if os.path.exists(path)], config.CHECKSUM_MANIFEST,
+                      config.CHECKSUM_THREADS)
+
+    work_units = build_work_units(files, config.MAX_EVENTS)
+    check_coverage(work_units)
+    print(f"Skimming {len(work_units)} chunks of at most {config.MAX_EVENTS} events, "
+          f"on {config.N_WORKERS} worker(s).")
+    results = run_units(work_units, skim_chunk)
+
+    n_events = sum(result['n_events'] for _, result in results)
+    n_skimmed = sum(result['n_skimmed'] for _, result in results)
+    print(f"\n{n_skimmed} of {n_events} events kept in the skims of {config.SKIM_CACHE_DIR}")
+
+    skim_profile = StageProfiler()
+    for _, result in results:
+        skim_profile.merge(result['profile'])
+    skim_profile.print_summary()
+    return results
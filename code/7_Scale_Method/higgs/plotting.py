@@ -0,0 +1,121 @@
+import matplotlib.pyplot as plt
+import numpy as np
+
+from . import config
+from .candidate_store import read_candidates
+from .histogram import load_histograms
+from .lumi_mask import analysis_luminosity_pb
+from .results import combined_histograms
+
+# matplotlib is only imported by this module: the pipeline, its workers and the fit never load it.
+
+
+def plot_higgs_mass(z_boson_df):
+    """ Displays the final invariant mass M4l distribution. """
+
+    # Check if the DataFrame is empty before attempting to plot
+    if z_boson_df.empty:
+        print("DEBUG: Z candidate DataFrame is empty; cannot plot Higgs mass.")
+        return
+
+    print("\n--- STATUS: Z Candidates and Higgs Mass ($M_{4l}$) calculated. ---")
+    # Display the histogram of the Higgs invariant mass
+    plt.figure(figsize=(10, 6))
+    plt.hist(
+        z_boson_df['mass'],
+        bins=20,
+        range=(80, 150),
+        color='skyblue',
+        edgecolor='black',
+        alpha=0.7,
+        label='$M_{4\\ell}$ Distribution'
+    )
+
+    # Reference line for the known Higgs mass (125 GeV)
+    plt.axvline(125.09, color='red', linestyle='--', linewidth=2, label='$M_H \\approx 125.1$ GeV')
+
+    plt.title('Invariant Mass Distribution $M_{4\\ell}$ (Higgs Candidates)')
+    plt.xlabel('Invariant Mass $M_{4\\ell}$ (GeV)')
+    plt.ylabel("Number of Events")
+    plt.legend()
+    plt.grid(axis='y', alpha=0.5)
+    plt.show()
+
+    print(f"\nHiggs invariant mass (M_4l) histogram generated for {len(z_boson_df)} events.")
+
+
+def plot_higgs_mass_histogram(m4l_hist):
+    """ Displays the M4l distribution from an already filled Histogram, with its statistical errors. """
+    if m4l_hist.sum_w.sum() == 0:
+        print("DEBUG: M4l histogram is empty; cannot plot Higgs mass.")
+        return
+
+    plt.figure(figsize=(10, 6))
+    plt.stairs(m4l_hist.sum_w, m4l_hist.edges, fill=True, color='skyblue', alpha=0.7,
+               label='$M_{4\\ell}$ Distribution')
+    plt.errorbar(m4l_hist.centers, m4l_hist.sum_w, yerr=m4l_hist.errors, fmt='none', ecolor='black', capsize=2)
+
+    # Reference line for the known Higgs mass (125 GeV)
+    plt.axvline(125.09, color='red', linestyle='--', linewidth=2, label='$M_H \\approx 125.1$ GeV')
+
+    plt.title('Invariant Mass Distribution $M_{4\\ell}$ (Higgs Candidates)')
+    plt.xlabel('Invariant Mass $M_{4\\ell}$ (GeV)')
+    plt.ylabel("Number of Events")
+    plt.legend()
+    plt.grid(axis='y', alpha=0.5)
+    plt.show()
+
+
+def plot_combined_higgs_mass(data_hist, background_hist, signal_hist):
+    """
+    Plots the M4l distribution of the data (points with Poisson errors) over the
+    stacked MC background and Higgs signal, with the MC statistical error band.
+    """
+    if data_hist.sum_w.sum() == 0:
+        print("WARNING: No data candidate in the plotted mass range.")
+        return
+
+    edges = data_hist.edges
+    bin_width = edges[1] - edges[0]
+    prediction = background_hist + signal_hist
+
+    plt.figure(figsize=(10, 7))
+    plt.stairs(background_hist.sum_w, edges, fill=True, color='#1f77b4', alpha=0.8,
+               label='Background $ZZ \\to 4\\ell$')
+    plt.stairs(prediction.sum_w, edges, baseline=background_hist.sum_w, fill=True, color='#d62728',
+               alpha=0.8, label='Higgs Signal $m_H = 125$ GeV')
+    plt.fill_between(edges, np.append(prediction.sum_w - prediction.errors, 0),
+                     np.append(prediction.sum_w + prediction.errors, 0), step='post',
+                     color='gray', alpha=0.4, hatch='///', label='MC stat. uncertainty')
+    plt.errorbar(data_hist.centers, data_hist.sum_w, yerr=data_hist.errors, fmt='o',
+                 color='black', capsize=3, label='Data')
+
+    plt.xlabel('Invariant Mass $M_{4\\ell}$ (GeV)', fontsize=14)
+    plt.ylabel(f"Number of Events / ({bin_width:.2f} GeV)", fontsize=14)
+    plt.title(f'Distribution of $M_{{4\\ell}}$: Higgs Search $H \\to 4\\ell$ '
+              f'({analysis_luminosity_pb() / 1000:.2f} $fb^{{-1}}$)', fontsize=16)
+    plt.grid(axis='y', alpha=0.5)
+    plt.legend(loc='upper right', fontsize=12)
+    plt.xlim(edges[0], edges[-1])
+    plt.ylim(bottom=0)
+    plt.show()
+
+    print("\n--- Normalization Diagnostic ---")
+    print(f"Data events: {data_hist.sum_w.sum():.0f}")
+    print(f"MC background: {background_hist.sum_w.sum():.2f}, MC signal: {signal_hist.sum_w.sum():.2f}")
+
+
+def plot_data():
+    """ Plots the M4l distribution of the data candidates (or of the saved histograms with FROM_HISTOGRAMS). """
+    if config.FROM_HISTOGRAMS:
+        plot_higgs_mass_histogram(load_histograms(config.HISTOGRAM_DIR, config.DATA_FILES.keys()))
+    else:
+        # Only the M4l column is read, from memory-mapped Arrow files.
+        # Events recorded in both the DoubleMuon and DoubleElectron datasets are counted once.
+        plot_higgs_mass(read_candidates(config.CANDIDATES_DIR, columns=['mass'], keys=config.DATA_FILES.keys(),
+                                        drop_duplicates=True))
+
+
+def plot_combined():
+    """ Plots the data over the MC background and signal (from the saved histograms with FROM_HISTOGRAMS). """
+    plot_combined_higgs_mass(*combined_histograms())
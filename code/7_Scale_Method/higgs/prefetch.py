@@ -0,0 +1,149 @@
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import uproot
+
+# Thread pools of the current process, shared by all the chunks it reads.
+_EXECUTORS = {}
+
+# Marks the end of a prefetched stream
+_DONE = object()
+
+# Seconds between two checks of the stop event by a producer waiting for room in the buffer
+_PUT_TIMEOUT = 0.1
+
+
+def get_decompression_executor(n_threads):
+    """
+    Returns a thread pool that uproot can use to decompress baskets in parallel
+    (decompression_executor / interpretation_executor), or None for a single thread.
+    """
+    if n_threads <= 1:
+        return None
+    if n_threads not in _EXECUTORS:
+        _EXECUTORS[n_threads] = ThreadPoolExecutor(max_workers=n_threads)
+    return _EXECUTORS[n_threads]
+
+
+def prefetch(batches, depth=1):
+    """
+    Reads the next `depth` items of an iterator in a background thread,
+    so that reading and decompressing a batch overlaps with the processing of the previous one.
+    Exceptions raised while reading are re-raised in the consumer. If the consumer stops early
+    (an exception, or the generator is closed), the thread stops after its current item and closes
+    the iterator, so it does not keep a batch or the file open.
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    iterator = iter(batches)
+
+    def put(item):
+        """ Puts an item in the buffer, waiting for room; False if the consumer stopped meanwhile. """
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for batch in iterator:
+                if not put(batch):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(e)
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # The items left in the buffer are dropped, which also frees a producer waiting for room
+        while True:
+            try:
+                buffer.get_nowait()
+            except queue.Empty:
+                break
+        thread.join()
+
+
+def branch_timings(tree, branches, entry_start=None, entry_stop=None):
+    """
+    Measures, for each branch, the time spent reading its compressed baskets from the storage
+    and the time spent decompressing them, for the entries [entry_start, entry_stop).
+    Baskets are first read as raw bytes through the file source (the I/O part, e.g. on NFS),
+    then read again as TBasket objects, which decompresses them (the raw bytes are then
+    in the page cache, so the second time is dominated by decompression).
+    Returns one dictionary per branch.
+    """
+    entry_start = 0 if entry_start is None else entry_start
+    entry_stop = tree.num_entries if entry_stop is None else entry_stop
+    source = tree.file.source
+
+    timings = []
+    for name in branches:
+        branch = tree[name]
+        baskets = branch.entries_to_ranges_or_baskets(entry_start, entry_stop)
+
+        start = time.perf_counter()
+        compressed_bytes = 0
+        for _, (seek_start, seek_stop) in baskets:
+            compressed_bytes += len(source.chunk(seek_start, seek_stop).raw_data)
+        read_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        uncompressed_bytes = 0
+        for basket_num, _ in baskets:
+            uncompressed_bytes += branch.basket(basket_num).uncompressed_bytes
+        decompress_s = time.perf_counter() - start
+
+        timings.append({
+            'branch': name,
+            'n_baskets': len(baskets),
+            'compressed_bytes': compressed_bytes,
+            'uncompressed_bytes': uncompressed_bytes,
+            'read_s': read_s,
+            'decompress_s': decompress_s,
+        })
+    return timings
+
+
+def print_branch_timings(timings):
+    """ Prints the per-branch timings as a table, slowest branches first. """
+    print(f"{'Branch':<28} {'Baskets':>8} {'Compressed MB':>14} {'Ratio':>6} {'Read s':>8} {'Decompress s':>13}")
+    for t in sorted(timings, key=lambda t: t['read_s'] + t['decompress_s'], reverse=True):
+        ratio = t['uncompressed_bytes'] / t['compressed_bytes'] if t['compressed_bytes'] else 0.0
+        print(f"{t['branch']:<28} {t['n_baskets']:>8} {t['compressed_bytes'] / 1e6:>14.2f} "
+              f"{ratio:>6.2f} {t['read_s']:>8.3f} {t['decompress_s']:>13.3f}")
+    total_read = sum(t['read_s'] for t in timings)
+    total_decompress = sum(t['decompress_s'] for t in timings)
+    print(f"{'Total':<28} {'':>8} {'':>14} {'':>6} {total_read:>8.3f} {total_decompress:>13.3f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(f"Usage: python {sys.argv[0]} <file.root> [entry_stop]", file=sys.stderr)
+        sys.exit(1)
+
+    from .event_selection import lepton_branches
+
+    with uproot.open(sys.argv[1]) as file:
+        entry_stop = int(sys.argv[2]) if len(sys.argv) > 2 else None
+        print_branch_timings(branch_timings(file["Events"], lepton_branches(), entry_stop=entry_stop))
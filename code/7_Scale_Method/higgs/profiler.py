@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager, nullcontext
+
+# Peak memory of each stage. The kernel only keeps the peak RSS of the whole process (ru_maxrss),
+# which would give every stage the peak of the largest stage run before it. On Linux, writing "5"
+# to /proc/self/clear_refs resets that peak to the current RSS, so it is reset when a stage starts
+# and read when it ends. Before each reset, the peak reached so far is added to the stages still open
+# (in other threads) and kept for peak_rss_mb(). Elsewhere, a stage records its RSS at its start and end.
+_CLEAR_REFS_PATH = "/proc/self/clear_refs"
+_STATM_PATH = "/proc/self/statm"
+_peak_lock = threading.Lock()
+# {stage token: highest RSS seen since it started, MB} of the stages in progress
+_open_peaks = {}
+_process_peak_mb = 0.0
+_can_reset_peak = sys.platform.startswith("linux")
+
+
+def _kernel_peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def peak_rss_mb():
+    """ Peak resident memory of the current process since it started, in MB. """
+    return max(_process_peak_mb, _kernel_peak_rss_mb())
+
+
+def current_rss_mb():
+    """ Resident memory of the current process, in MB (its peak where /proc is not available). """
+    try:
+        with open(_STATM_PATH) as f:
+            resident_pages = int(f.read().split()[1])
+    except OSError:
+        return _kernel_peak_rss_mb()
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024**2
+
+
+def _fold_peak_rss(rss_mb):
+    """ Adds a RSS reading to the process peak and to the peaks of the open stages. Called with _peak_lock. """
+    global _process_peak_mb
+    _process_peak_mb = max(_process_peak_mb, rss_mb)
+    for token in _open_peaks:
+        _open_peaks[token] = max(_open_peaks[token], rss_mb)
+
+
+def _start_stage_peak(token):
+    """ Starts following the peak RSS of a stage; returns the RSS at its start, in MB. """
+    global _can_reset_peak
+    with _peak_lock:
+        rss_start = current_rss_mb()
+        if _can_reset_peak:
+            _fold_peak_rss(_kernel_peak_rss_mb())
+            try:
+                with open(_CLEAR_REFS_PATH, "w") as f:
+                    f.write("5")
+            except OSError:
+                # Kernel older than 4.0, or /proc not writable
+                _can_reset_peak = False
+        _open_peaks[token] = rss_start
+        return rss_start
+
+
+def _end_stage_peak(token):
+    """ Peak RSS of a stage since _start_stage_peak(token), in MB. """
+    with _peak_lock:
+        _fold_peak_rss(_kernel_peak_rss_mb() if _can_reset_peak else current_rss_mb())
+        return _open_peaks.pop(token)
+
+
+class StageRecord:
+    """ Counters filled inside a profiled stage. """
+
+    def __init__(self):
+        self.events = 0
+        self.rows_in = 0
+        self.rows_out = 0
+        # Set to True to leave this call out of the profile
+        self.discard = False
+
+
+class StageProfiler:
+    """
+    Accumulates, for each pipeline stage: calls, wall time, CPU time, the peak RSS reached during the stage
+    and its increase over the RSS at the start of the stage (the largest over the calls),
+    input/output row counts and the number of events handled.
+    Profiles from several worker processes are combined with merge().
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        record = StageRecord()
+        token = object()
+        rss_start = _start_stage_peak(token)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            stage_peak = _end_stage_peak(token)
+        if record.discard:
+            return
+        stats = self.stages.setdefault(name, {
+            'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'peak_rss_mb': 0.0, 'peak_increase_mb': 0.0,
+            'events': 0, 'rows_in': 0, 'rows_out': 0,
+        })
+        stats['calls'] += 1
+        stats['wall_s'] += time.perf_counter() - wall_start
+        stats['cpu_s'] += time.process_time() - cpu_start
+        stats['peak_rss_mb'] = max(stats['peak_rss_mb'], stage_peak)
+        stats['peak_increase_mb'] = max(stats['peak_increase_mb'], stage_peak - rss_start)
+        stats['events'] += record.events
+        stats['rows_in'] += record.rows_in
+        stats['rows_out'] += record.rows_out
+
+    def merge(self, other_stages):
+        """ Adds the stages of another profile (e.g. a worker's to_dict()) to this one. """
+        for name, other in other_stages.items():
+            stats = self.stages.setdefault(name, dict.fromkeys(other, 0))
+            for field, value in other.items():
+                if field in ('peak_rss_mb', 'peak_increase_mb'):
+                    stats[field] = max(stats[field], value)
+                else:
+                    stats[field] += value
+
+    def to_dict(self):
+        summary = {}
+        for name, stats in self.stages.items():
+            summary[name] = dict(stats)
+            summary[name]['events_per_s'] = stats['events'] / stats['wall_s'] if stats['wall_s'] > 0 else 0.0
+        return summary
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    def print_summary(self):
+        print(f"\n{'Stage':<24} {'Calls':>6} {'Wall s':>9} {'CPU s':>9} {'Peak RSS MB':>12} {'Peak +MB':>9} "
+              f"{'Rows in':>11} {'Rows out':>11} {'Events/s':>12}")
+        for name, stats in self.to_dict().items():
+            print(f"{name:<24} {stats['calls']:>6} {stats['wall_s']:>9.2f} {stats['cpu_s']:>9.2f} "
+                  f"{stats['peak_rss_mb']:>12.0f} {stats['peak_increase_mb']:>9.0f} {stats['rows_in']:>11} {stats['rows_out']:>11} "
+                  f"{stats['events_per_s']:>12,.0f}")
+
+
+def profile_stage(profiler, name):
+    """ profiler.stage(name), or a context doing nothing when profiling is off (profiler is None). """
+    if profiler is None:
+        return nullcontext(StageRecord())
+    return profiler.stage(name)
+
+
+def profile_batches(batches, profiler, name="load"):
+    """
+    Times the production of each (entry_start, entry_stop, events) batch of a stream.
+    With a prefetched stream this is the reading time that is not hidden behind the computation.
+    """
+    iterator = iter(batches)
+    while True:
+        with profile_stage(profiler, name) as record:
+            batch = next(iterator, None)
+            if batch is None:
+                # End of the stream, not a batch
+                record.discard = True
+                return
+            entry_start, entry_stop, events = batch
+            record.events = entry_stop - entry_start
+            record.rows_in = entry_stop - entry_start
+            record.rows_out = len(events)
+        yield entry_start, entry_stop, events
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from . import config
+from .candidate_store import read_candidates
+from .histogram import Histogram, load_histograms
+from .datasets import mc_files, weight_table, apply_weights
+from .lumi_mask import analysis_luminosity_pb
+
+# Luminosity-weighted M4l histograms of the stored candidates, shared by the plots and the fit.
+
+
+def weighted_histogram(z_df, binning=None):
+    """ M4l Histogram of candidates holding a 'weight' column (binning defaults to config.PLOT_BINNING). """
+    binning = binning or config.PLOT_BINNING
+    return Histogram.regular(*binning).fill(z_df['mass'], z_df['weight'], n_threads=config.FILL_THREADS)
+
+
+def load_weighted_candidates(weights):
+    """
+    Reads the data and MC candidates and attaches their weights in one pass.
+    Data duplicates (same collision in two datasets) are removed; MC samples are independent
+    simulations, so their (run, luminosityBlock, event) are not compared.
+    """
+    data_df = read_candidates(config.CANDIDATES_DIR, columns=['mass', 'key'], keys=config.DATA_FILES.keys(),
+                              drop_duplicates=True)
+    mc_df = read_candidates(config.CANDIDATES_DIR, columns=['mass', 'key'], keys=mc_files().keys())
+    z_df = pd.concat([data_df, mc_df], ignore_index=True)
+    z_df['key'] = z_df['key'].astype(str)
+    return apply_weights(z_df, weights)
+
+
+def combined_histograms(binning=None):
+    """
+    (data, background, signal) M4l histograms, the MC ones normalized to the luminosity (analysis_luminosity_pb).
+    With config.FROM_HISTOGRAMS, the saved histograms (config.M4L_BINNING, 1 GeV bins) are merged into 2 GeV bins.
+    """
+    weights = weight_table(config.DATA_FILES.keys(), analysis_luminosity_pb())
+    signal_keys = list(mc_files("signal"))
+    background_keys = list(mc_files("background"))
+
+    if config.FROM_HISTOGRAMS:
+        return (load_histograms(config.HISTOGRAM_DIR, config.DATA_FILES.keys()).rebin(2),
+                load_histograms(config.HISTOGRAM_DIR, background_keys, weights).rebin(2),
+                load_histograms(config.HISTOGRAM_DIR, signal_keys, weights).rebin(2))
+
+    z_df = load_weighted_candidates(weights)
+    return (weighted_histogram(z_df[z_df['key'].isin(config.DATA_FILES.keys())], binning),
+            weighted_histogram(z_df[z_df['key'].isin(background_keys)], binning),
+            weighted_histogram(z_df[z_df['key'].isin(signal_keys)], binning))
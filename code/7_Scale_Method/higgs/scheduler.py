@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+from collections import namedtuple
+
+import uproot
+
+from .executors import LocalExecutor
+
+# One chunk of one file: the entries [entry_start, entry_stop) of the 'Events' tree.
+WorkUnit = namedtuple("WorkUnit", ["key", "file_path", "index", "entry_start", "entry_stop"])
+
+# ROOT files opened by the current process. Each worker keeps its files open between chunks.
+_OPEN_FILES = {}
+
+
+def get_events_tree(file_path):
+    """
+    Returns the 'Events' tree of a file, opening the file only the first time
+    it is requested by this process.
+    """
+    if file_path not in _OPEN_FILES:
+        _OPEN_FILES[file_path] = uproot.open(file_path)
+    return _OPEN_FILES[file_path]["Events"]
+
+
+def close_open_files():
+    """ Closes every file opened by get_events_tree in this process. """
+    for file in _OPEN_FILES.values():
+        file.close()
+    _OPEN_FILES.clear()
+
+
+def init_worker():
+    # A forked worker must not reuse the file handles of the parent process
+    _OPEN_FILES.clear()
+
+
+def build_work_units(data_files, chunk_size):
+    """
+    Splits every existing file of data_files into chunks of at most chunk_size entries.
+    The last chunk of a file holds the remaining entries, so every entry belongs to exactly one unit.
+    """
+    units = []
+    for key, file_path in data_files.items():
+        if not os.path.exists(file_path):
+            print(f"WARNING: File not found '{file_path}'. Skipped. Check the path.")
+            continue
+
+        with uproot.open(file_path) as file:
+            n_entries = file["Events"].num_entries
+
+        for index, entry_start in enumerate(range(0, n_entries, chunk_size)):
+            entry_stop = min(entry_start + chunk_size, n_entries)
+            units.append(WorkUnit(key, file_path, index, entry_start, entry_stop))
+    return units
+
+
+class ProgressBar:
+    """
+    Single-line progress bar on stderr, showing processed events and the event rate.
+    """
+
+    def __init__(self, total_events, width=40):
+        self.total_events = total_events
+        self.width = width
+        self.done_events = 0
+        self.start_time = time.perf_counter()
+
+    def update(self, n_events):
+        self.done_events += n_events
+        elapsed = time.perf_counter() - self.start_time
+        fraction = self.done_events / self.total_events if self.total_events else 1.0
+        filled = int(self.width * fraction)
+        rate = self.done_events / elapsed if elapsed > 0 else 0.0
+
+        bar = "#" * filled + "-" * (self.width - filled)
+        sys.stderr.write(
+            f"\r[{bar}] {100 * fraction:5.1f}% "
+            f"{self.done_events}/{self.total_events} events | {rate:,.0f} events/s"
+        )
+        sys.stderr.flush()
+
+    def close(self):
+        sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def run_work_units(units, process_unit, n_workers=1, on_result=None, executor=None):
+    """
+    Runs process_unit(unit) for every work unit, on n_workers processes of this machine,
+    or on executor (see executors.py) when given.
+    process_unit must be a module-level function and return a dictionary with
+    at least 'n_events'. on_result(unit, result), if given, is called in this process
+    as soon as a unit is finished. Returns the list of (unit, result) in completion order.
+    """
+    total_events = sum(unit.entry_stop - unit.entry_start for unit in units)
+    progress = ProgressBar(total_events)
+    results = []
+
+    if executor is None and n_workers <= 1:
+        for unit in units:
+            result = process_unit(unit)
+            results.append((unit, result))
+            if on_result is not None:
+                on_result(unit, result)
+            progress.update(result['n_events'])
+        close_open_files()
+        progress.close()
+        return results
+
+    if executor is None:
+        executor = LocalExecutor(n_workers, initializer=init_worker)
+    for unit, result in executor.map_unordered(process_unit, units):
+        results.append((unit, result))
+        if on_result is not None:
+            on_result(unit, result)
+        progress.update(result['n_events'])
+
+    progress.close()
+    return results
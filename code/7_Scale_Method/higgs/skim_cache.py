@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+
+import awkward as ak
+
+from .checksums import adler32_of_file
+
+# Layout of the cached skims; changed when the skimmed events change type
+# (2: compact lepton types, 3: float32 mass after the cleaning)
+SKIM_FORMAT = 3
+
+
+class SkimCache:
+    """
+    On-disk cache of skimmed events (after the lepton quality cuts and cleaning).
+    Entries are addressed by a hash of everything that defines a skim: the checksum of
+    the input file, the entry range, the branches read and the cut values.
+    The least recently used entries are evicted when the cache grows beyond max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.checksum_index_path = os.path.join(cache_dir, "file_checksums.json")
+
+    def file_checksum(self, file_path):
+        """
+        Adler-32 of an input file. The value is stored with the file size and modification time,
+        so a multi-GiB file is only read again when it changes.
+        """
+        stat = os.stat(file_path)
+        index = {}
+        if os.path.exists(self.checksum_index_path):
+            with open(self.checksum_index_path) as f:
+                index = json.load(f)
+
+        abs_path = os.path.abspath(file_path)
+        entry = index.get(abs_path)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+            return entry['adler32']
+
+        checksum = adler32_of_file(file_path)
+        index[abs_path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'adler32': checksum}
+        tmp_path = f"{self.checksum_index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, self.checksum_index_path)
+        return checksum
+
+    def skim_key(self, file_path, entry_start, entry_stop, branches, cuts):
+        """ Content address of the skim of entries [entry_start, entry_stop) of a file. """
+        description = {
+            'file_adler32': self.file_checksum(file_path),
+            'entry_start': entry_start,
+            'entry_stop': entry_stop,
+            'branches': sorted(branches),
+            'cuts': cuts,
+            'format': SKIM_FORMAT,
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def get(self, key):
+        """ Returns the cached skim, or None on a miss. A hit marks the entry as recently used. """
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            os.utime(path)
+            events = ak.from_parquet(path)
+        except (FileNotFoundError, ValueError):
+            # Evicted by another worker in the meantime
+            return None
+        return events
+
+    def put(self, key, events):
+        """ Stores a skim, then evicts old entries if the cache is over its size budget. """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        ak.to_parquet(events, tmp_path)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """ Deletes the least recently used skims until the cache fits in max_bytes. """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".parquet"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
@@ -0,0 +1,215 @@
+import sys
+
+import numpy as np
+import awkward as ak
+import uproot
+
+from .pairing import Z_MASS
+
+Z_WIDTH = 2.4952
+HIGGS_MASS = 125.09
+
+# PDG flavor, NanoAOD collection and mass (GeV) of the generated leptons
+LEPTONS = {13: ("Muon", 0.105658), 11: ("Electron", 0.000511)}
+
+# Mean number of pile-up / fake leptons per event in each collection
+MEAN_MUONS = 1.0
+MEAN_ELECTRONS = 1.0
+# Fractions of events with an injected Z -> ll decay and an injected H -> ZZ* -> 4l decay
+Z_FRACTION = 0.2
+HIGGS_FRACTION = 0.01
+
+# Event numbering: runs of the Run2012B range, with a fixed number of events per luminosity block
+FIRST_RUN = 194000
+EVENTS_PER_LUMI_BLOCK = 1000
+LUMI_BLOCKS_PER_RUN = 500
+
+# Events generated and written at a time (bounds the memory of large files)
+BATCH_SIZE = 1_000_000
+
+
+def _boost(p4, beta):
+    """ Lorentz boost of (n, 4) four-vectors (E, px, py, pz) by the (n, 3) velocities beta. """
+    beta2 = np.sum(beta**2, axis=1)
+    gamma = 1 / np.sqrt(1 - beta2)
+    beta_p = np.sum(beta * p4[:, 1:], axis=1)
+    factor = np.divide(gamma - 1, beta2, out=np.zeros_like(beta2), where=beta2 > 0)
+    energy = gamma * (p4[:, 0] + beta_p)
+    momentum = p4[:, 1:] + (factor * beta_p + gamma * p4[:, 0])[:, None] * beta
+    return np.column_stack([energy, momentum])
+
+
+def two_body_decay(parent, parent_mass, mass1, mass2, rng):
+    """
+    Isotropic decays of parents (four-vectors in the lab frame) into two daughters of masses
+    mass1 and mass2 (arrays). Returns the two (n, 4) daughter four-vectors in the lab frame.
+    """
+    n = len(parent)
+    p_star = np.sqrt(np.maximum(
+        (parent_mass**2 - (mass1 + mass2)**2) * (parent_mass**2 - (mass1 - mass2)**2), 0
+    )) / (2 * parent_mass)
+    cos_theta = rng.uniform(-1, 1, n)
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    phi = rng.uniform(-np.pi, np.pi, n)
+    direction = np.column_stack([sin_theta * np.cos(phi), sin_theta * np.sin(phi), cos_theta])
+
+    daughter1 = np.column_stack([np.sqrt(p_star**2 + mass1**2), p_star[:, None] * direction])
+    daughter2 = np.column_stack([np.sqrt(p_star**2 + mass2**2), -p_star[:, None] * direction])
+    beta = parent[:, 1:] / parent[:, :1]
+    return _boost(daughter1, beta), _boost(daughter2, beta)
+
+
+def produce_resonances(mass, rng, mean_pt=10.0, rapidity_width=1.5):
+    """ Lab-frame four-vectors of resonances of the given masses, with a falling pT and a central rapidity. """
+    n = len(mass)
+    pt = rng.exponential(mean_pt, n)
+    phi = rng.uniform(-np.pi, np.pi, n)
+    rapidity = rng.normal(0, rapidity_width, n)
+    mt = np.sqrt(mass**2 + pt**2)
+    return np.column_stack([mt * np.cosh(rapidity), pt * np.cos(phi), pt * np.sin(phi), mt * np.sinh(rapidity)])
+
+
+def _breit_wigner(n, mass, width, low, high, rng):
+    """ n Breit-Wigner (Cauchy) masses, redrawn until they fall in [low, high]. """
+    values = mass + width / 2 * rng.standard_cauchy(n)
+    outside = (values < low) | (values > high)
+    while outside.any():
+        values[outside] = mass + width / 2 * rng.standard_cauchy(outside.sum())
+        outside = (values < low) | (values > high)
+    return values
+
+
+def _z_to_leptons(z, z_mass, rng):
+    """ Leptons (four-vectors, charges, flavors) of Z decays, each Z decaying to muons or electrons. """
+    n = len(z)
+    flavor = rng.choice([13, 11], n)
+    lepton_mass = np.where(flavor == 13, LEPTONS[13][1], LEPTONS[11][1])
+    negative, positive = two_body_decay(z, z_mass, lepton_mass, lepton_mass, rng)
+    return (np.concatenate([negative, positive]), np.repeat([-1, 1], n), np.tile(flavor, 2))
+
+
+def _lepton_table(event, p4, charge, flavor, iso):
+    """ Flat lepton table (event, pt, eta, phi, mass, charge, flavor, iso) from lab four-vectors. """
+    pt = np.hypot(p4[:, 1], p4[:, 2])
+    return {
+        "event": event,
+        "pt": pt,
+        "eta": np.arcsinh(p4[:, 3] / pt),
+        "phi": np.arctan2(p4[:, 2], p4[:, 1]),
+        "mass": np.sqrt(np.maximum(p4[:, 0]**2 - pt**2 - p4[:, 3]**2, 0)),
+        "charge": charge,
+        "flavor": flavor,
+        "iso": iso,
+    }
+
+
+def generate_leptons(n_events, rng, mean_muons=MEAN_MUONS, mean_electrons=MEAN_ELECTRONS,
+                     z_fraction=Z_FRACTION, higgs_fraction=HIGGS_FRACTION):
+    """
+    Flat lepton table of n_events events: Poisson numbers of soft, poorly isolated leptons,
+    plus the isolated leptons of injected Z -> ll and H -> ZZ* -> 4l decays.
+    """
+    tables = []
+
+    # Pile-up and fake leptons
+    for flavor, mean in ((13, mean_muons), (11, mean_electrons)):
+        counts = rng.poisson(mean, n_events)
+        n = counts.sum()
+        tables.append({
+            "event": np.repeat(np.arange(n_events), counts),
+            "pt": 3 + rng.exponential(8, n),
+            "eta": rng.uniform(-2.7, 2.7, n),
+            "phi": rng.uniform(-np.pi, np.pi, n),
+            "mass": np.full(n, LEPTONS[flavor][1]),
+            "charge": rng.choice([-1, 1], n),
+            "flavor": np.full(n, flavor),
+            "iso": rng.exponential(0.3, n),
+        })
+
+    # Z -> ll
+    z_events = np.flatnonzero(rng.random(n_events) < z_fraction)
+    z_mass = _breit_wigner(len(z_events), Z_MASS, Z_WIDTH, 60.0, 120.0, rng)
+    p4, charge, flavor = _z_to_leptons(produce_resonances(z_mass, rng), z_mass, rng)
+    tables.append(_lepton_table(np.tile(z_events, 2), p4, charge, flavor, rng.exponential(0.05, len(p4))))
+
+    # H -> Z Z* -> 4l: an on-shell Z1 and an off-shell Z2 sharing the remaining mass
+    h_events = np.flatnonzero(rng.random(n_events) < higgs_fraction)
+    n_higgs = len(h_events)
+    h_mass = rng.normal(HIGGS_MASS, 1.0, n_higgs)
+    z1_mass = _breit_wigner(n_higgs, Z_MASS, Z_WIDTH, 50.0, 105.0, rng)
+    z1_mass = np.minimum(z1_mass, h_mass - 13.0)
+    z2_mass = rng.uniform(12.0, h_mass - z1_mass)
+    z1, z2 = two_body_decay(produce_resonances(h_mass, rng, mean_pt=20.0), h_mass, z1_mass, z2_mass, rng)
+    for z, mass in ((z1, z1_mass), (z2, z2_mass)):
+        p4, charge, flavor = _z_to_leptons(z, mass, rng)
+        tables.append(_lepton_table(np.tile(h_events, 2), p4, charge, flavor, rng.exponential(0.05, len(p4))))
+
+    return {field: np.concatenate([table[field] for table in tables]) for field in tables[0]}
+
+
+def leptons_to_collections(leptons, n_events):
+    """
+    NanoAOD-like 'Muon' and 'Electron' collections (jagged, pT-ordered in each event)
+    from a flat lepton table.
+    """
+    collections = {}
+    for flavor, (name, _) in LEPTONS.items():
+        selected = leptons["flavor"] == flavor
+        order = np.lexsort((-leptons["pt"][selected], leptons["event"][selected]))
+        counts = np.bincount(leptons["event"][selected], minlength=n_events)
+        fields = {
+            "pt": np.float32, "eta": np.float32, "phi": np.float32, "mass": np.float32,
+            "charge": np.int32, "iso": np.float32,
+        }
+        columns = {
+            ("pfRelIso03_all" if field == "iso" else field): leptons[field][selected][order].astype(dtype)
+            for field, dtype in fields.items()
+        }
+        collections[name] = ak.unflatten(ak.zip(columns), counts)
+    return collections
+
+
+def event_numbers(first_event, n_events):
+    """ run, luminosityBlock and event numbers of the events [first_event, first_event + n_events). """
+    index = np.arange(first_event, first_event + n_events, dtype=np.uint64)
+    lumi_index = index // EVENTS_PER_LUMI_BLOCK
+    return {
+        "run": (FIRST_RUN + lumi_index // LUMI_BLOCKS_PER_RUN).astype(np.uint32),
+        "luminosityBlock": (1 + lumi_index % LUMI_BLOCKS_PER_RUN).astype(np.uint32),
+        "event": index + 1,
+    }
+
+
+def write_synthetic_file(output_path, n_events, seed=0, batch_size=BATCH_SIZE, **generator_options):
+    """
+    Writes a ROOT file with an 'Events' tree of n_events synthetic events, with the branches read by
+    the analysis (run, luminosityBlock, event, nMuon, Muon_*, nElectron, Electron_*).
+    Events are generated and written in batches of batch_size. generator_options are passed to
+    generate_leptons (mean_muons, mean_electrons, z_fraction, higgs_fraction).
+    """
+    rng = np.random.default_rng(seed)
+    with uproot.recreate(output_path) as file:
+        for first_event in range(0, n_events, batch_size):
+            n_batch = min(batch_size, n_events - first_event)
+            batch = event_numbers(first_event, n_batch)
+            batch.update(leptons_to_collections(generate_leptons(n_batch, rng, **generator_options), n_batch))
+            if first_event == 0:
+                # A TTree with NanoAOD branch names (a plain assignment would write an RNTuple)
+                file.mktree(
+                    "Events",
+                    {name: values.dtype if isinstance(values, np.ndarray) else values.type.content
+                     for name, values in batch.items()},
+                    counter_name=lambda collection: "n" + collection,
+                    field_name=lambda collection, field: f"{collection}_{field}",
+                )
+            file["Events"].extend(batch)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(f"Usage: python {sys.argv[0]} <output.root> <n_events> [seed]", file=sys.stderr)
+        sys.exit(1)
+
+    write_synthetic_file(sys.argv[1], int(float(sys.argv[2])), seed=int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    with uproot.open(sys.argv[1]) as file:
+        print(f"Wrote {file['Events'].num_entries} events to {sys.argv[1]}")
@@ -0,0 +1,55 @@
+from collections import namedtuple
+
+import awkward as ak
+
+from .pairing import Z_MASS
+from .event_selection import QUALITY_CUTS, SKIM_MIN_LEPTONS, apply_quality_cuts_events
+
+# One configuration of the selection: lepton cuts (same keys as QUALITY_CUTS),
+# reference Z mass of the pairing, and a factor applied to the lepton transverse momenta.
+Variation = namedtuple("Variation", ["name", "cuts", "z_mass", "momentum_scale"])
+
+NOMINAL = Variation("nominal", QUALITY_CUTS, Z_MASS, 1.0)
+
+
+def scan_variations(parameter, values, base=NOMINAL):
+    """
+    Variations of base changing one parameter: a cut name ('pt_cut', 'eta_max', 'iso_cut'),
+    'z_mass' or 'momentum_scale'. They are named '<parameter>_<value>'.
+    """
+    variations = []
+    for value in values:
+        name = f"{parameter}_{value:g}"
+        if parameter in base.cuts:
+            variations.append(base._replace(name=name, cuts=dict(base.cuts, **{parameter: value})))
+        elif parameter in ("z_mass", "momentum_scale"):
+            variations.append(base._replace(name=name, **{parameter: value}))
+        else:
+            raise ValueError(f"Unknown variation parameter '{parameter}'.")
+    return variations
+
+
+def loosest_cuts(variations):
+    """
+    Cuts keeping every lepton that passes the cuts of at least one variation.
+    A skim made with them can be re-selected for each variation without reading the data again.
+    The pT cut is taken before the momentum scale (pT x scale > cut means pT > cut / scale).
+    """
+    return {
+        "pt_cut": min(v.cuts["pt_cut"] / v.momentum_scale for v in variations),
+        "eta_max": max(v.cuts["eta_max"] for v in variations),
+        "iso_cut": max(v.cuts["iso_cut"] for v in variations),
+    }
+
+
+def apply_variation(events, variation, min_leptons=SKIM_MIN_LEPTONS):
+    """
+    Selects the leptons of a variation from skimmed events (skimmed with loosest_cuts):
+    scales the lepton momenta, then applies the cuts of the variation.
+    Events left with fewer than min_leptons leptons are dropped.
+    """
+    if variation.momentum_scale != 1.0:
+        leptons = ak.with_field(events.leptons, events.leptons.pt * variation.momentum_scale, "pt")
+        events = ak.with_field(events, leptons, "leptons")
+    events = apply_quality_cuts_events(events, **variation.cuts)
+    return events[ak.num(events.leptons) >= min_leptons]
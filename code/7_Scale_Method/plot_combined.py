@@ -0,0 +1,13 @@
+from higgs import config
+from higgs.plotting import plot_combined
+
+# Plots the data over the stacked MC background and signal, from the candidate tables
+# written by main.py (with PROCESS_MC = True for the MC samples), in config.PLOT_BINNING bins.
+# Plot from the saved histograms instead of the candidate tables (data events recorded
+# in both the DoubleMuon and DoubleElectron datasets are then counted twice)
+FROM_HISTOGRAMS = False
+
+
+if __name__ == "__main__":
+    config.FROM_HISTOGRAMS = FROM_HISTOGRAMS
+    plot_combined()
@@ -0,0 +1,217 @@
+import os
+import sys
+import importlib.util
+import json
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather
+import uproot
+import awkward as ak
+
+from higgs import config
+from higgs.candidate_store import read_candidates
+from higgs.flat_selection import find_z_candidates
+from higgs.pairing import find_z_candidates_columnar
+from higgs.histogram import Histogram, histogram_path
+from higgs.synthetic_events import write_synthetic_file
+from benchmark import run_pipeline, git_commit
+from bench_pairing import generate_synthetic_leptons, add_lorentz_vectors, check_parity
+
+# Golden references (committed with the code) and the scratch directory of the regression runs
+GOLDEN_DIR = "golden/"
+REGRESSION_DIR = config.DATA_DIR + "regression/"
+
+# Fixed input: a synthetic file of REGRESSION_EVENTS events generated with REGRESSION_SEED,
+# processed in chunks of REGRESSION_CHUNK_SIZE events (not a divisor, so the tail chunk is tested)
+REGRESSION_EVENTS = 50_000
+REGRESSION_SEED = 0
+REGRESSION_CHUNK_SIZE = 12_345
+REGRESSION_KEY = "Synthetic"
+
+# Columns identifying a candidate, and tolerances of the other columns.
+# Masses are stored as float32, whose relative precision is about 6e-8.
+ID_COLUMNS = ['key', 'run', 'luminosityBlock', 'event_id']
+FLOAT_RTOL = 1e-5
+FLOAT_ATOL = 1e-4
+HISTOGRAM_ATOL = 0.0
+
+# Synthetic leptons of the parity check of the columnar pairing against the loop reference
+PARITY_EVENTS = 2_000
+PARITY_SEED = 1
+
+# Number of differing candidates printed for each kind of difference
+N_EXAMPLES = 10
+
+
+def regression_input():
+    """ Path of the fixed synthetic input, generated the first time it is needed. """
+    path = os.path.join(REGRESSION_DIR, f"synthetic_{REGRESSION_EVENTS}_seed{REGRESSION_SEED}.root")
+    if not os.path.exists(path):
+        os.makedirs(REGRESSION_DIR, exist_ok=True)
+        write_synthetic_file(path + ".tmp", REGRESSION_EVENTS, seed=REGRESSION_SEED)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def input_checksum(path):
+    """
+    Adler-32 (hex) of the event content of a ROOT file: the values of every branch, in order.
+    The file bytes themselves change at every generation (ROOT stores a UUID and dates).
+    """
+    checksum = 1
+    with uproot.open(path) as file:
+        tree = file["Events"]
+        for name in sorted(tree.keys()):
+            checksum = zlib.adler32(name.encode(), checksum)
+            for batch in tree.iterate([name], step_size="100 MB"):
+                values = ak.to_numpy(ak.flatten(batch[name], axis=None))
+                checksum = zlib.adler32(np.ascontiguousarray(values).tobytes(), checksum)
+    return f"{checksum:08x}"
+
+
+def run_regression_pipeline():
+    """ Runs the pipeline on the fixed input. Returns (candidates sorted by ID_COLUMNS, M4l histogram). """
+    config.MAX_EVENTS = REGRESSION_CHUNK_SIZE
+    output_dir = os.path.join(REGRESSION_DIR, "output/")
+    run_pipeline({REGRESSION_KEY: regression_input()}, output_dir)
+
+    z_df = read_candidates(config.CANDIDATES_DIR)
+    z_df['key'] = z_df['key'].astype(str)
+    z_df = z_df.sort_values(ID_COLUMNS, kind='stable').reset_index(drop=True)
+    return z_df, Histogram.load(histogram_path(config.HISTOGRAM_DIR, REGRESSION_KEY))
+
+
+def save_golden(z_df, m4l_hist, golden_dir=GOLDEN_DIR):
+    """ Stores the candidates, the histogram and a description of the input as the golden reference. """
+    os.makedirs(golden_dir, exist_ok=True)
+    pyarrow.feather.write_feather(pa.Table.from_pandas(z_df, preserve_index=False),
+                                  os.path.join(golden_dir, "candidates.arrow"), compression="uncompressed")
+    m4l_hist.save(os.path.join(golden_dir, "m4l.npz"))
+    metadata = {
+        'date': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'commit': git_commit(),
+        'pipeline_mode': config.PIPELINE_MODE,
+        'n_events': REGRESSION_EVENTS,
+        'seed': REGRESSION_SEED,
+        'input_adler32': input_checksum(regression_input()),
+        'n_candidates': len(z_df),
+    }
+    with open(os.path.join(golden_dir, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=1)
+
+
+def load_golden(golden_dir=GOLDEN_DIR):
+    """ (candidates, histogram, metadata) of the golden reference. """
+    z_df = pyarrow.feather.read_table(os.path.join(golden_dir, "candidates.arrow")).to_pandas()
+    m4l_hist = Histogram.load(os.path.join(golden_dir, "m4l.npz"))
+    with open(os.path.join(golden_dir, "metadata.json")) as f:
+        metadata = json.load(f)
+    return z_df, m4l_hist, metadata
+
+
+def compare_candidates(golden_df, current_df):
+    """
+    Matches the candidates of both tables by ID_COLUMNS and compares every other column:
+    exactly for integer columns, with FLOAT_RTOL / FLOAT_ATOL for floating point columns.
+    Returns {difference kind: DataFrame of the differing candidates}; empty when they agree.
+    """
+    merged = golden_df.merge(current_df, on=ID_COLUMNS, how='outer',
+                             suffixes=('_golden', '_current'), indicator=True)
+    differences = {}
+    if (merged['_merge'] == 'left_only').any():
+        differences['missing'] = merged.loc[merged['_merge'] == 'left_only', ID_COLUMNS]
+    if (merged['_merge'] == 'right_only').any():
+        differences['extra'] = merged.loc[merged['_merge'] == 'right_only', ID_COLUMNS]
+
+    both = merged[merged['_merge'] == 'both']
+    columns = [column for column in golden_df.columns if column not in ID_COLUMNS]
+    for column in columns:
+        if column not in current_df.columns:
+            differences[f"column '{column}' missing"] = pd.DataFrame()
+            continue
+        golden_values = both[f"{column}_golden"].to_numpy()
+        current_values = both[f"{column}_current"].to_numpy()
+        if np.issubdtype(golden_values.dtype, np.floating):
+            equal = np.isclose(current_values, golden_values, rtol=FLOAT_RTOL, atol=FLOAT_ATOL, equal_nan=True)
+        else:
+            equal = current_values == golden_values
+        if not equal.all():
+            differences[column] = both.loc[~equal, ID_COLUMNS + [f"{column}_golden", f"{column}_current"]]
+    return differences
+
+
+def compare_histograms(golden_hist, current_hist):
+    """ Bins whose content differs by more than HISTOGRAM_ATOL, as a DataFrame (empty when they agree). """
+    if not np.array_equal(golden_hist.edges, current_hist.edges):
+        return pd.DataFrame({'edges_golden': [golden_hist.edges], 'edges_current': [current_hist.edges]})
+    differ = np.abs(current_hist.sum_w - golden_hist.sum_w) > HISTOGRAM_ATOL
+    return pd.DataFrame({
+        'low_edge': golden_hist.edges[:-1][differ],
+        'golden': golden_hist.sum_w[differ],
+        'current': current_hist.sum_w[differ],
+    })
+
+
+def check_pairing_parity(n_events=PARITY_EVENTS):
+    """
+    Checks that find_z_candidates_columnar selects the same events with the same M4l as the loop
+    reference find_z_candidates, on synthetic leptons. Returns True if they agree.
+    The loop reference needs the vector package; without it the check is skipped.
+    """
+    if importlib.util.find_spec("vector") is None:
+        print("Pairing parity check skipped: the loop reference needs vector (pip install -e '.[bench]').")
+        return True
+
+    leptons_df = add_lorentz_vectors(generate_synthetic_leptons(n_events, seed=PARITY_SEED))
+    reference_df = find_z_candidates(leptons_df.copy())
+    columnar_df = find_z_candidates_columnar(leptons_df)
+    if not check_parity(reference_df, columnar_df):
+        print(f"ERROR: The columnar pairing ({len(columnar_df)} candidates) does not match the loop reference "
+              f"({len(reference_df)} candidates) on {n_events} synthetic events.")
+        return False
+    print(f"Pairing parity: {len(columnar_df)} candidates selected by the columnar and the loop versions.")
+    return True
+
+
+def check_against_golden(golden_dir=GOLDEN_DIR):
+    """ Runs the pipeline and compares it with the golden reference. Returns True if they agree. """
+    golden_df, golden_hist, metadata = load_golden(golden_dir)
+    input_adler32 = input_checksum(regression_input())
+    if input_adler32 != metadata['input_adler32']:
+        print(f"ERROR: The regression input (adler32 {input_adler32}) is not the one of the golden reference "
+              f"({metadata['input_adler32']}). The generator changed: check it, then rerun with 'update'.")
+        return False
+
+    current_df, current_hist = run_regression_pipeline()
+    differences = compare_candidates(golden_df, current_df)
+    histogram_differences = compare_histograms(golden_hist, current_hist)
+
+    print(f"\nGolden reference: {metadata['n_candidates']} candidates (commit {metadata['commit']}, {metadata['date']})")
+    print(f"Current run: {len(current_df)} candidates")
+    for kind, rows in differences.items():
+        print(f"\n{len(rows)} candidate(s) differ: {kind}")
+        print(rows.head(N_EXAMPLES).to_string(index=False))
+    if not histogram_differences.empty:
+        print(f"\n{len(histogram_differences)} M4l histogram bin(s) differ:")
+        print(histogram_differences.head(N_EXAMPLES).to_string(index=False))
+
+    agree = not differences and histogram_differences.empty
+    print("\nRegression check passed." if agree else "\nRegression check FAILED.")
+    return agree
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == "update":
+        z_df, m4l_hist = run_regression_pipeline()
+        save_golden(z_df, m4l_hist)
+        print(f"Golden reference updated in {GOLDEN_DIR}: {len(z_df)} candidates.")
+    elif len(sys.argv) > 1:
+        print(f"Usage: python {sys.argv[0]} [update]", file=sys.stderr)
+        sys.exit(1)
+    else:
+        parity = check_pairing_parity()
+        sys.exit(0 if check_against_golden() and parity else 1)
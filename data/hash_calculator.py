@@ -1,27 +1,20 @@
-import zlib
+import os
 import sys
 
+# The checksum is computed by the higgs package (code/7_Scale_Method/higgs/checksums.py),
+# installed with 'pip install -e code/7_Scale_Method', or taken from this checkout otherwise.
+try:
+    from higgs.checksums import adler32_of_file
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code", "7_Scale_Method"))
+    from higgs.checksums import adler32_of_file
+
+
 def calculate_adler32(filepath):
     """Calculates the Adler-32 checksum of a file."""
-    # Initialize Adler-32 checksum
-    adler_value = 1
-
     try:
-        with open(filepath, 'rb') as f:
-            while True:
-                # Read 64KB block by block
-                data = f.read(65536)
-                if not data:
-                    break
-                # Update the checksum with the new block of data
-                adler_value = zlib.adler32(data, adler_value)
-
-            # Ensure the value is treated as an unsigned 32-bit integer
-            if adler_value < 0:
-                adler_value += 2**32
-
-            # Print the result in hexadecimal format (e.g., 'c09d0234')
-            print(f"{adler_value:08x}")
+        # Print the result in hexadecimal format (e.g., 'c09d0234')
+        print(adler32_of_file(filepath))
 
     except FileNotFoundError:
         print(f"Error: File not found at {filepath}", file=sys.stderr)
@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+import argparse
+
+# Verifies the downloaded files against a manifest of their expected Adler-32 checksums
+# (format in code/7_Scale_Method/higgs/checksums.py), several files at the same time.
+# The higgs package is installed with 'pip install -e code/7_Scale_Method', or taken from this checkout otherwise.
+try:
+    from higgs.checksums import load_manifest, verify_files, write_results
+except ImportError:
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "code", "7_Scale_Method"))
+    from higgs.checksums import load_manifest, verify_files, write_results
+
+# Default manifest, in the data directory
+MANIFEST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "checksums.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifies the data files against their expected Adler-32 checksums.")
+    parser.add_argument("manifest", nargs="?", default=MANIFEST_PATH, help="JSON manifest {relative path: checksum}")
+    parser.add_argument("--threads", type=int, default=4, help="files checksummed at the same time (default 4)")
+    parser.add_argument("--stop-early", action="store_true", help="stop at the first mismatching or missing file")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    def print_result(result):
+        rate = "" if not result['seconds'] else f" ({result['size'] / result['seconds'] / 1024**2:.0f} MiB/s)"
+        print(f"{result['status']:>8} {result['path']} {result['adler32'] or '-'}{rate}")
+
+    start = time.perf_counter()
+    results = verify_files(load_manifest(args.manifest), args.threads, args.stop_early, on_result=print_result)
+    if args.output:
+        write_results(results, args.output)
+
+    n_ok = sum(result['status'] == "ok" for result in results)
+    print(f"{n_ok}/{len(results)} files verified in {time.perf_counter() - start:.1f} s.")
+    return 0 if n_ok == len(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())